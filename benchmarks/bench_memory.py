@@ -0,0 +1,55 @@
+"""Measure how much memory a large checklist takes once it's loaded.
+
+Compares the plain entry dicts that json.load gives back with a Checklist
+built from them, which packs its entries into a ReleaseTable. The
+Checklist figure includes its link and artist indexes.
+"""
+
+import argparse
+import gc
+import json
+import sys
+import tracemalloc
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent.joinpath("mchecklist")))
+
+from checklist import Checklist
+import synthetic
+
+
+def _measure(build):
+    gc.collect()
+    tracemalloc.start()
+    result = build()
+    gc.collect()
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+
+    return result, size
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--size", type=int, default=100_000, help="Checklist entries.")
+    args = parser.parse_args()
+
+    text = json.dumps(synthetic.make_checklist(args.size))
+
+    checklist_json, dicts_size = _measure(lambda: json.loads(text))
+    del checklist_json
+
+    checklist, checklist_size = _measure(lambda: Checklist(json.loads(text)))
+
+    print(f"entry dicts  {dicts_size / 2**20:7.1f} MiB  {dicts_size / args.size:6.0f} B/entry")
+    print(
+        f"Checklist    {checklist_size / 2**20:7.1f} MiB  "
+        f"{checklist_size / args.size:6.0f} B/entry  "
+        f"({dicts_size / checklist_size:.1f}x smaller)"
+    )
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,138 @@
+"""Run the request scheduler against a local stub server that rate limits.
+
+The stub serves a synthetic artist page and answers 429 (with Retry-After)
+once clients go over its own request rate, or 503 when too many requests
+are in flight at once. Many background fetches are made from a thread pool
+while a few interactive ones are sent in between, and the throughput, the
+number of throttled responses, the rate and concurrency the scheduler
+settled on and how long the interactive requests waited are printed.
+"""
+
+import argparse
+import statistics
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent.joinpath("mchecklist")))
+
+import rymapi
+import synthetic
+
+
+class StubServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, rate: float, burst: int, max_in_flight: int, latency: float):
+        super().__init__(("127.0.0.1", 0), StubHandler)
+        self.bucket = rymapi.TokenBucket(rate, burst)
+        self.max_in_flight = max_in_flight
+        self.latency = latency
+        self.page = synthetic.make_artist_page("stub", 20)
+        self.in_flight = 0
+        self.statuses = {}
+        self.lock = threading.Lock()
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.server_address[1]}"
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        server = self.server
+
+        with server.lock:
+            server.in_flight += 1
+            if server.in_flight > server.max_in_flight:
+                status = 503
+            elif server.bucket.take() > 0:
+                status = 429
+            else:
+                status = 200
+            server.statuses[status] = server.statuses.get(status, 0) + 1
+
+        try:
+            time.sleep(server.latency)
+
+            self.send_response(status)
+            if status == 200:
+                self.send_header("Content-Length", str(len(server.page)))
+                self.end_headers()
+                self.wfile.write(server.page)
+            else:
+                self.send_header("Retry-After", "1")
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+        finally:
+            with server.lock:
+                server.in_flight -= 1
+
+    def log_message(self, format, *args):
+        pass
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--workers", type=int, default=16)
+    parser.add_argument("--server-rate", type=float, default=20.0)
+    parser.add_argument("--server-burst", type=int, default=5)
+    parser.add_argument("--server-concurrency", type=int, default=6)
+    parser.add_argument("--latency", type=float, default=0.05, help="In seconds.")
+    args = parser.parse_args()
+
+    server = StubServer(
+        args.server_rate, args.server_burst, args.server_concurrency, args.latency
+    )
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    fetcher = rymapi.Fetcher(scheduler=rymapi.Scheduler())
+    interactive_waits = []
+
+    def fetch(i: int, priority: int) -> int:
+        start = time.perf_counter()
+        response = fetcher.get(f"{server.url}/artist/{i}", priority=priority)
+        if priority == rymapi.INTERACTIVE:
+            interactive_waits.append(time.perf_counter() - start)
+
+        return response.status_code
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.workers) as executor:
+        futures = [
+            executor.submit(fetch, i, rymapi.BACKGROUND) for i in range(args.requests)
+        ]
+
+        # Interactive requests arrive while the background queue is full
+        for i in range(5):
+            time.sleep(0.5)
+            futures.append(executor.submit(fetch, -i, rymapi.INTERACTIVE))
+
+        results = [future.result() for future in futures]
+    elapsed = time.perf_counter() - start
+
+    server.shutdown()
+
+    host = fetcher.scheduler.host(server.url.split("//")[1])
+    succeeded = results.count(200)
+
+    print(f"requests         {len(results)} ({succeeded} succeeded)")
+    print(f"throughput       {succeeded / elapsed:.1f} requests/s")
+    print(f"server limit     {args.server_rate:.1f} requests/s")
+    print(f"server statuses  {dict(sorted(server.statuses.items()))}")
+    print(f"settled rate     {host.bucket.rate:.1f} requests/s")
+    print(f"settled limit    {host.concurrency:.1f} in flight")
+    print(
+        f"interactive wait median {statistics.median(interactive_waits) * 1000:.0f} ms, "
+        f"max {max(interactive_waits) * 1000:.0f} ms"
+    )
+
+    return 0 if succeeded == len(results) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
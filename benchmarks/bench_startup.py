@@ -0,0 +1,98 @@
+"""Time how long `mchecklist list` and `mchecklist view` take to start.
+
+The commands run from a copy of the package in a temporary directory, so
+the real config and checklists are never touched. Bare interpreter startup
+is timed too and subtracted before comparing against the budget, since it
+varies a lot between machines. Exits with status 1 if any command is over
+the budget.
+"""
+
+import argparse
+import json
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import List
+
+import synthetic
+
+
+PACKAGE_DIR = Path(__file__).resolve().parent.parent.joinpath("mchecklist")
+BUDGET_MS = 100
+COMMANDS = [["list"], ["view"]]
+
+
+def _set_up(directory: Path, size: int) -> None:
+    for source_file in PACKAGE_DIR.glob("*.py"):
+        shutil.copy(source_file, directory)
+    shutil.copytree(
+        PACKAGE_DIR.joinpath("rymapi"),
+        directory.joinpath("rymapi"),
+        ignore=shutil.ignore_patterns("__pycache__"),
+    )
+
+    config_json = {
+        "current": "bench",
+        "popularity_filter": 0,
+        "show_ratings": False,
+        "show_average": False,
+    }
+    directory.joinpath("config.json").write_text(json.dumps(config_json))
+
+    directory.joinpath("checklists").mkdir()
+    directory.joinpath("checklists", "bench.json").write_text(
+        json.dumps(synthetic.make_checklist(size))
+    )
+
+
+def _time_command(args: List[str], runs: int) -> List[float]:
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, *args], check=True, stdout=subprocess.DEVNULL)
+        timings.append((time.perf_counter() - start) * 1000)
+
+    return timings
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=10)
+    parser.add_argument("--size", type=int, default=1000, help="Checklist entries.")
+    parser.add_argument("--budget", type=float, default=BUDGET_MS, help="In ms.")
+    args = parser.parse_args()
+
+    interpreter = statistics.median(_time_command(["-c", "pass"], args.runs))
+    print(f"python -c pass    median {interpreter:6.1f} ms")
+
+    over_budget = False
+    with tempfile.TemporaryDirectory() as directory:
+        directory = Path(directory)
+        _set_up(directory, args.size)
+
+        for command in COMMANDS:
+            timings = _time_command(
+                [str(directory.joinpath("cli.py")), *command], args.runs
+            )
+            median = statistics.median(timings)
+            over_budget = over_budget or median - interpreter > args.budget
+
+            print(
+                f"mchecklist {' '.join(command):<6} "
+                f"median {median:6.1f} ms  min {min(timings):6.1f} ms  "
+                f"(+{median - interpreter:.1f} ms over the interpreter)"
+            )
+
+    if over_budget:
+        print(f"Over the {args.budget:.0f} ms budget.")
+        return 1
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
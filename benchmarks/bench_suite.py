@@ -0,0 +1,281 @@
+"""Time parsing, filtering, rendering, checklist storage and sampling offline.
+
+Everything runs against synthetic artist pages and checklists from
+synthetic.py, with the config and checklists kept in a temporary
+directory, so nothing touches the network or the real checklists. Results
+can be written as JSON with --output and compared against an earlier run
+with --compare, which exits with status 1 if anything got slower than
+--threshold times its earlier median.
+"""
+
+import argparse
+import itertools
+import json
+import platform
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent.joinpath("mchecklist")))
+
+from bs4 import BeautifulSoup
+from checklist import Checklist
+from httpcache import ResponseCache
+from release import Release
+import mchecklist
+import rymapi
+import sampler
+import storage
+import synthetic
+
+
+CHECKLIST_SIZES = [1_000, 10_000, 100_000]
+PAGE_SIZES = [20, 200]
+ADD_BATCH_SIZE = 100
+PICKS = 1_000
+THRESHOLD = 1.25
+
+
+def _time(
+    run: Callable[[], object], runs: int, setup: Optional[Callable[[], object]] = None
+) -> List[float]:
+    timings = []
+    for _ in range(runs):
+        if setup:
+            setup()
+
+        start = time.perf_counter()
+        run()
+        timings.append((time.perf_counter() - start) * 1000)
+
+    return timings
+
+
+def _make_releases(size: int) -> List[Release]:
+    return [
+        Release(
+            entry["artist"],
+            entry["title"],
+            entry["link"],
+            entry["artist_link"],
+            (i * 7919) % 50_000,
+            round(1 + (i % 400) / 100, 2),
+            entry["year"],
+            entry["type"],
+        )
+        for i, entry in enumerate(synthetic.make_entries(size))
+    ]
+
+
+def _use_checklist(store_class, checklist_json: Dict) -> None:
+    """Make a checklist with CHECKLIST_JSON in it the current one."""
+
+    name = f"bench{store_class.suffix.strip('.')}{len(checklist_json['to-do'])}"
+    mchecklist.init_checklist(name, use_sqlite=store_class is storage.SqliteStore)
+    mchecklist.get_current_store().save(checklist_json)
+    mchecklist.get_current_checklist.cache_clear()
+
+
+def bench_parsing(directory: Path, runs: int) -> Dict[str, List[float]]:
+    results = {}
+
+    rymapi.CACHE = ResponseCache(
+        directory.joinpath("cache"), rymapi.CACHE_TTL, rymapi.CACHE_MAX_SIZE
+    )
+
+    for size in PAGE_SIZES:
+        page = synthetic.make_artist_page("bench", size)
+        artist_link = f"https://rateyourmusic.com/artist/bench{size}"
+        rymapi.CACHE.put(artist_link, page)
+
+        results[f"parse_discography/{size}"] = _time(
+            lambda: rymapi.parse_discography(page, artist_link), runs
+        )
+
+        release_tags = BeautifulSoup(page, "html.parser").select(".disco_release")
+        results[f"get_artist_release_info/{size}"] = _time(
+            lambda: [
+                rymapi._get_artist_release_info(tag, "album", "bench", artist_link)
+                for tag in release_tags
+            ],
+            runs,
+        )
+
+        # Through the response cache, with the parsed discographies forgotten
+        results[f"get_artist_releases/{size}"] = _time(
+            lambda: rymapi.get_artist_releases(f"bench{size}", rymapi.ALL_TYPES),
+            runs,
+            setup=rymapi._DISCOGRAPHIES.clear,
+        )
+
+    return results
+
+
+def bench_releases(sizes: List[int], runs: int) -> Dict[str, List[float]]:
+    results = {}
+
+    _use_checklist(storage.JsonStore, storage.empty_checklist())
+
+    for size in sizes:
+        releases = _make_releases(size)
+
+        results[f"filter_releases/{size}"] = _time(
+            lambda: mchecklist.filter_releases(releases), runs
+        )
+        results[f"filter_releases_all/{size}"] = _time(
+            lambda: mchecklist.filter_releases(releases, max_len=None), runs
+        )
+        results[f"releases_to_string/{size}"] = _time(
+            lambda: mchecklist.releases_to_string(releases), runs
+        )
+
+    return results
+
+
+def bench_storage(sizes: List[int], runs: int) -> Dict[str, List[float]]:
+    results = {}
+
+    for store_class, size in itertools.product(storage.STORES, sizes):
+        backend = store_class.suffix.strip(".")
+        checklist_json = synthetic.make_checklist(size, completed_fraction=0.5)
+        _use_checklist(store_class, checklist_json)
+        store = mchecklist.get_current_store()
+
+        results[f"load/{backend}/{size}"] = _time(
+            lambda: Checklist(store.load()), runs
+        )
+        results[f"save/{backend}/{size}"] = _time(
+            lambda: store.save(mchecklist.get_current_checklist().to_json()), runs
+        )
+
+        new_releases = iter(_make_releases(size + ADD_BATCH_SIZE * runs)[size:])
+        results[f"add_releases/{backend}/{size}"] = _time(
+            lambda: mchecklist.add_releases(
+                list(itertools.islice(new_releases, ADD_BATCH_SIZE))
+            ),
+            runs,
+        )
+
+        todo = iter(list(mchecklist.get_current_checklist().todo_entries()))
+        results[f"check_release/{backend}/{size}"] = _time(
+            lambda: mchecklist.check_release(next(todo)), runs
+        )
+
+        store.close()
+
+    return results
+
+
+def bench_sampling(sizes: List[int], runs: int) -> Dict[str, List[float]]:
+    """The first pick, which builds the sampler's lists, then PICKS more."""
+
+    results = {}
+
+    for size, mode in itertools.product(sizes, sampler.MODES):
+        checklist_json = synthetic.make_checklist(size, completed_fraction=0.5)
+        checklist = None
+
+        def load() -> None:
+            nonlocal checklist
+            checklist = Checklist(checklist_json)
+
+        results[f"first_pick/{mode}/{size}"] = _time(
+            lambda: checklist.sampler.pick(mode), runs, load
+        )
+        results[f"picks/{mode}/{size}"] = _time(
+            lambda: [checklist.sampler.pick(mode) for _ in range(PICKS)], runs
+        )
+
+    return results
+
+
+def _summarize(timings: Dict[str, List[float]]) -> Dict[str, Dict]:
+    return {
+        name: {
+            "median_ms": statistics.median(times),
+            "min_ms": min(times),
+            "runs": len(times),
+        }
+        for name, times in timings.items()
+    }
+
+
+def _compare(results: Dict[str, Dict], baseline_path: Path, threshold: float) -> bool:
+    """Print each benchmark's change since the baseline; True if any regressed."""
+
+    with open(baseline_path) as baseline_file:
+        baseline = json.load(baseline_file)["results"]
+
+    regressed = False
+    for name, result in results.items():
+        if name not in baseline:
+            continue
+
+        ratio = result["median_ms"] / max(baseline[name]["median_ms"], 1e-6)
+        slower = ratio > threshold
+        regressed = regressed or slower
+
+        print(f"{name:<36} {ratio:5.2f}x{'  SLOWER' if slower else ''}")
+
+    return regressed
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument(
+        "--sizes",
+        type=lambda sizes: [int(size) for size in sizes.split(",")],
+        default=CHECKLIST_SIZES,
+        help="Comma-separated checklist sizes, e.g. 1000,1000000.",
+    )
+    parser.add_argument("--output", type=Path, help="Write the results as JSON.")
+    parser.add_argument("--compare", type=Path, help="Earlier --output to compare.")
+    parser.add_argument("--threshold", type=float, default=THRESHOLD)
+    args = parser.parse_args()
+
+    timings = {}
+    with tempfile.TemporaryDirectory() as directory:
+        directory = Path(directory)
+        mchecklist.CHECKLIST_DIR = directory.joinpath("checklists")
+        mchecklist.CONFIG_FILE = directory.joinpath("config.json")
+
+        timings.update(bench_parsing(directory, args.runs))
+        timings.update(bench_releases(args.sizes, args.runs))
+        timings.update(bench_storage(args.sizes, args.runs))
+        timings.update(bench_sampling(args.sizes, args.runs))
+
+    results = _summarize(timings)
+
+    for name, result in results.items():
+        print(
+            f"{name:<36} median {result['median_ms']:9.2f} ms  "
+            f"min {result['min_ms']:9.2f} ms"
+        )
+
+    if args.output:
+        with open(args.output, "w") as output_file:
+            json.dump(
+                {
+                    "python": platform.python_version(),
+                    "platform": platform.platform(),
+                    "time": time.time(),
+                    "results": results,
+                },
+                output_file,
+                indent=2,
+            )
+
+    if args.compare:
+        print()
+        if _compare(results, args.compare, args.threshold):
+            return 1
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,107 @@
+"""Synthetic artist pages and checklists for the offline benchmarks.
+
+Pages follow the markup rymapi reads from real artist pages: an
+.artist_page name, and a #disco_type_s/e/m section per release type with a
+"Showing X of Y" header and one .disco_release per release.
+"""
+
+import random
+from typing import Dict, List, Optional
+
+
+SECTION_TYPES = {"s": "album", "e": "ep", "m": "mixtape"}
+
+
+def _release_html(rng: random.Random, name: str, id_: str, i: int, rated: bool) -> str:
+    title = f"{name} {SECTION_TYPES[id_]} {i}"
+    link = f"/release/{SECTION_TYPES[id_]}/{name}/{SECTION_TYPES[id_]}-{i}/"
+    ratings = f"{rng.randint(1, 50000):,}" if rated else ""
+    average = f"{rng.uniform(0.5, 5):.2f}" if rated else ""
+
+    return (
+        '<div class="disco_release">'
+        f'<div class="disco_avg_rating">{average}</div>'
+        f'<div class="disco_ratings">{ratings}</div>'
+        '<div class="disco_info">'
+        f'<div class="disco_mainline"><a title="{title}" href="{link}">{title}</a></div>'
+        f'<div class="disco_subline"><span>{rng.randint(1960, 2024)}</span></div>'
+        "</div></div>"
+    )
+
+
+def make_artist_page(
+    name: str,
+    releases_per_type=20,
+    seed=0,
+    shown: Optional[int] = None,
+    unrated_fraction=0.1,
+) -> bytes:
+    """An artist page with RELEASES_PER_TYPE releases in each section.
+
+    With SHOWN, each section only contains its first SHOWN releases, like a
+    page that still needs expanding.
+    """
+
+    rng = random.Random(seed)
+
+    sections = []
+    for id_, release_type in SECTION_TYPES.items():
+        count = releases_per_type if shown is None else min(shown, releases_per_type)
+        releases = "".join(
+            _release_html(rng, name, id_, i, rng.random() >= unrated_fraction)
+            for i in range(count)
+        )
+        sections.append(
+            f'<div id="disco_type_{id_}" class="section_artist_discography">'
+            f'<div class="disco_header_top"><h3>{release_type}</h3>'
+            f'<div class="disco_showing"><span>Showing {count} of {releases_per_type}'
+            "</span></div></div>"
+            f"{releases}</div>"
+        )
+
+    page = (
+        f"<html><head><title>{name}</title></head><body>"
+        # Enough unrelated markup for the parser to skip over
+        + "<div class='sidebar'><p>filler</p></div>" * 200
+        + f'<div class="artist_page"><meta itemprop="name" content="{name}">'
+        + f'<div id="discography">{"".join(sections)}</div>'
+        + "</div></body></html>"
+    )
+
+    return page.encode("utf-8")
+
+
+def make_entries(size: int, seed=0, releases_per_artist=10) -> List[Dict]:
+    """SIZE checklist entries, RELEASES_PER_ARTIST to an artist."""
+
+    rng = random.Random(seed)
+
+    entries = []
+    for i in range(size):
+        artist = f"artist{i // releases_per_artist}"
+        release_type = rng.choice(list(SECTION_TYPES.values()))
+        entries.append(
+            {
+                "artist": artist,
+                "title": f"release{i}",
+                "link": f"/release/{release_type}/{artist}/release{i}/",
+                "artist_link": f"https://rateyourmusic.com/artist/{artist}",
+                "year": rng.randint(1960, 2024),
+                "type": release_type,
+            }
+        )
+
+    return entries
+
+
+def make_checklist(size: int, seed=0, completed_fraction=0.0) -> Dict:
+    """A checklist document with SIZE entries, as JsonStore would load it."""
+
+    entries = make_entries(size, seed)
+    split = int(size * (1 - completed_fraction))
+
+    return {
+        "viewing": entries[:10],
+        "to-do": entries[:split],
+        "completed": entries[split:],
+    }
@@ -0,0 +1,158 @@
+from typing import Dict, Iterable, Iterator, List, Optional
+from release import ReleaseRecord, ReleaseTable
+from sampler import Sampler
+
+
+class Checklist:
+    """The entries of a checklist, indexed by link and by artist.
+
+    Entries are kept as rows of a ReleaseTable rather than as dicts.
+    'to-do' and 'completed' are dicts of link -> row so that status lookups
+    and moving an entry between them are O(1), and every artist's entries
+    can be found without scanning the whole checklist. Those dicts' keys
+    are the only place links are stored; records are made from a link and
+    its row when they're asked for.
+
+    'artist_pages' remembers, for each artist link, the hash of the artist
+    page its ratings were last read from and when that was.
+
+    Random picks go through 'sampler', which is kept up to date as entries
+    are added, checked and re-rated.
+    """
+
+    def __init__(self, checklist_json: Dict):
+        self.table = ReleaseTable()
+        self.todo: Dict[str, int] = {}
+        self.completed: Dict[str, int] = {}
+        self.viewing: List[ReleaseRecord] = []
+        self._artists: Dict[str, List[str]] = {}
+        self._artist_names: Dict[str, str] = {}
+        self.artist_pages: Dict[str, Dict] = dict(checklist_json.get("artist_pages", {}))
+
+        for entry in checklist_json["to-do"]:
+            self.todo[entry["link"]] = self._store(entry)
+        for entry in checklist_json["completed"]:
+            self.completed[entry["link"]] = self._store(entry)
+
+        self.viewing = [
+            self.get(entry["link"])
+            or self.table.record(self.table.append(entry), entry["link"])
+            for entry in checklist_json["viewing"]
+        ]
+
+        self.sampler = Sampler(self.todo, self._artists, self.table)
+
+    def __len__(self) -> int:
+        return len(self.todo) + len(self.completed)
+
+    def __contains__(self, link: str) -> bool:
+        return link in self.todo or link in self.completed
+
+    def _store(self, entry: Dict) -> int:
+        row = self.table.append(entry)
+
+        link = entry["link"]
+        artist_link = self.table.artist_link(row)
+        self._artists.setdefault(artist_link, []).append(link)
+        self._artist_names.setdefault(entry["artist"].lower(), artist_link)
+
+        return row
+
+    def _row(self, link: str) -> Optional[int]:
+        row = self.todo.get(link)
+        return row if row is not None else self.completed.get(link)
+
+    def get(self, link: str) -> Optional[ReleaseRecord]:
+        row = self._row(link)
+        if row is None:
+            return None
+
+        return self.table.record(row, link)
+
+    def todo_entries(self) -> Iterator[ReleaseRecord]:
+        for link, row in self.todo.items():
+            yield self.table.record(row, link)
+
+    def completed_entries(self) -> Iterator[ReleaseRecord]:
+        for link, row in self.completed.items():
+            yield self.table.record(row, link)
+
+    def status(self, link: str) -> Optional[str]:
+        """Whether the release with LINK is in 'to-do', 'completed' or neither."""
+
+        if link in self.todo:
+            return "to-do"
+        if link in self.completed:
+            return "completed"
+
+        return None
+
+    def add(self, entry: Dict) -> bool:
+        """Add an entry to 'to-do' unless its release is already in the checklist."""
+
+        if entry["link"] in self:
+            return False
+
+        self.todo[entry["link"]] = self._store(entry)
+        self.sampler.add(entry["link"])
+
+        return True
+
+    def add_many(self, entries: Iterable[Dict]) -> List[bool]:
+        """Add a batch of entries, skipping ones already in the checklist or batch."""
+
+        return [self.add(entry) for entry in entries]
+
+    def check(self, link: str) -> Optional[ReleaseRecord]:
+        """Move an entry from 'to-do' to 'completed' and return it."""
+
+        row = self.todo.pop(link, None)
+        if row is None:
+            return None
+
+        self.completed[link] = row
+        self.sampler.remove(row)
+
+        return self.table.record(row, link)
+
+    def artist_links(self) -> List[str]:
+        return list(self._artists)
+
+    def set_ratings(
+        self, link: str, ratings: Optional[int], average: Optional[float]
+    ) -> Optional[ReleaseRecord]:
+        row = self._row(link)
+        if row is None:
+            return None
+
+        self.table.set_ratings(row, ratings, average)
+        self.sampler.update(row)
+
+        return self.table.record(row, link)
+
+    def artist_link(self, artist: str) -> Optional[str]:
+        return self._artist_names.get(artist.lower())
+
+    def artist_entries(self, artist_link: str) -> List[ReleaseRecord]:
+        """Every entry by an artist, to-do entries first."""
+
+        links = self._artists.get(artist_link, [])
+
+        todo = [
+            self.table.record(self.todo[link], link) for link in links if link in self.todo
+        ]
+        completed = [
+            self.table.record(self.completed[link], link)
+            for link in links
+            if link in self.completed
+        ]
+
+        return todo + completed
+
+    def to_json(self) -> Dict:
+        return {
+            "viewing": [entry.to_dict() for entry in self.viewing],
+            "to-do": [entry.to_dict() for entry in self.todo_entries()],
+            "completed": [entry.to_dict() for entry in self.completed_entries()],
+            "artist_pages": self.artist_pages,
+        }
@@ -1,13 +1,21 @@
 import click
 import mchecklist
-import rymapi
-from rymapi import Release
-from typing import Set, List
+import profiling
+import sampler
+from pathlib import Path
+from release import Release
+from typing import Set, List, Iterable
 import re
+import shutil
+import sys
+import time
 
 
 CONTEXT_SETTINGS = dict(help_option_names=["-h", "--help"])
 ALL_TYPES = ["album", "ep", "mixtape"]
+MAX_WORKERS = 8
+INGEST_BATCH_SIZE = 500
+HTML_SUFFIXES = [".html", ".htm"]
 
 
 def _print_version(ctx, param, value):
@@ -59,6 +67,58 @@ def _parse_selection(input: str, releases: List[Release] = []) -> Set[int]:
     return chosen_set
 
 
+def _echo_releases(releases: Iterable[Release], count: int, **kwargs) -> None:
+    """Print releases as they're rendered, through a pager if they won't fit."""
+
+    stdout = sys.stdout
+
+    if stdout.isatty() and count > shutil.get_terminal_size().lines:
+        lines = mchecklist.iter_release_lines(releases, **kwargs)
+        click.echo_via_pager(f"{line}\n" for line in lines)
+    else:
+        mchecklist.write_releases(stdout, releases, **kwargs)
+
+
+def _echo_viewing() -> None:
+    viewing = mchecklist.get_current_checklist().viewing
+
+    _echo_releases(
+        viewing,
+        len(viewing),
+        add=False,
+        grouped=True,
+    )
+
+
+def _start_profiling(ctx, profile_output=None) -> None:
+    """Record phase timings now and print them once the command finishes."""
+
+    profiling.enable()
+    start = time.perf_counter()
+
+    profiler = None
+    if profile_output:
+        import cProfile
+
+        profiler = cProfile.Profile()
+        profiler.enable()
+
+    def finish():
+        if profiler:
+            profiler.disable()
+            profiler.dump_stats(profile_output)
+
+        click.echo("", err=True)
+        click.echo(profiling.summary(), err=True)
+        click.echo(
+            f"\ntotal {(time.perf_counter() - start) * 1000:.1f} ms", err=True
+        )
+        if profiler:
+            click.echo(f"cProfile stats written to {profile_output}", err=True)
+
+    ctx.call_on_close(finish)
+
+
 @click.group(context_settings=CONTEXT_SETTINGS)
 @click.option(
     "--version",
@@ -68,19 +128,40 @@ def _parse_selection(input: str, releases: List[Release] = []) -> Set[int]:
     is_eager=True,
     help="Show the version and exit.",
 )
-def cli():
-    pass
+@click.option(
+    "--profile",
+    is_flag=True,
+    type=bool,
+    default=False,
+    help="Print how long each phase of the command took.",
+)
+@click.option(
+    "--profile-output",
+    type=click.Path(dir_okay=False, writable=True),
+    help="Also dump cProfile stats for the whole command to this file.",
+)
+@click.pass_context
+def cli(ctx, profile=False, profile_output=None):
+    if profile or profile_output:
+        _start_profiling(ctx, profile_output)
 
 
 @cli.command()
 @click.option("--name", type=str, help="Set the checklist's name.")
-def create(name):
+@click.option(
+    "--sqlite",
+    is_flag=True,
+    type=bool,
+    default=False,
+    help="Store the checklist in an SQLite database instead of a JSON file.",
+)
+def create(name, sqlite=False):
     """Create a new checklist."""
 
     if not name:
-        filename = mchecklist.init_checklist()
+        filename = mchecklist.init_checklist(use_sqlite=sqlite)
     else:
-        filename = mchecklist.init_checklist(name)
+        filename = mchecklist.init_checklist(name, use_sqlite=sqlite)
 
     if not filename:
         click.echo(
@@ -131,6 +212,47 @@ def delete_checklist(checklist_name):
         click.echo(f"{checklist_name} successfully deleted.")
 
 
+@cli.command()
+@click.argument("checklist_names", nargs=-1, type=str)
+@click.option(
+    "--all",
+    "migrate_all",
+    is_flag=True,
+    type=bool,
+    default=False,
+    help="Migrate every JSON checklist.",
+)
+def migrate(checklist_names, migrate_all=False):
+    """Move the checklists CHECKLIST_NAMES from JSON files to SQLite databases."""
+
+    if migrate_all:
+        checklist_names = mchecklist.list_checklists(mark_current=False) or []
+
+    if not checklist_names:
+        click.echo("No checklists given.\nTry 'mchecklist migrate -h' for help.")
+        return
+
+    for checklist_name in checklist_names:
+        if not mchecklist.checklist_exists(checklist_name):
+            click.echo(f"Checklist with name {checklist_name} does not exist.")
+        elif mchecklist.migrate_checklist(checklist_name):
+            click.echo(f"{checklist_name} migrated to SQLite.")
+        elif not migrate_all:
+            click.echo(f"{checklist_name} is already stored in SQLite.")
+
+
+@cli.command()
+def compact():
+    """Fold the current checklist's change journal into its main file."""
+
+    if mchecklist.compact_checklist():
+        click.echo(f"{mchecklist.get_config()['current']} compacted.")
+    else:
+        click.echo(
+            "No checklist is currently selected. Try 'mchecklist create' to create a checklist."
+        )
+
+
 @cli.command()
 def list():
     """Prints a list of stored checklists."""
@@ -171,30 +293,48 @@ def list():
 @click.option(
     "--popularity-filter",
     type=float,
-    default=mchecklist.POP_FILTER,
+    default=lambda: mchecklist.get_config()["popularity_filter"],
     help="Only show releases with a certain proportion of the artist's most rated release's ratings.",
 )
+@click.option(
+    "--complete",
+    is_flag=True,
+    type=bool,
+    default=False,
+    help="Open a browser to load any discography sections cut off on the page.",
+)
 def add(
     artist: str,
     type=None,
     title="",
     show_all=False,
     add_all=False,
-    popularity_filter=mchecklist.POP_FILTER,
+    popularity_filter=0,
+    complete=False,
 ):
     """Select releases from ARTIST's discography to add."""
 
-    releases = rymapi.get_artist_releases(artist, ALL_TYPES)
+    import rymapi
+
+    if complete:
+        try:
+            discography = rymapi.get_complete_discography(artist)
+        finally:
+            rymapi.close_browsers()
+    else:
+        discography = rymapi.get_discography(artist)
 
-    if not releases:
+    if not discography:
         click.echo("Artist not found.")
         return
 
     if title:
-        for release in releases:
-            if title.lower() == release.title.lower():
-                mchecklist.add_releases([release])
-                return
+        release = discography.find_title(title)
+        if release:
+            mchecklist.add_releases([release])
+            return
+
+    releases = discography.releases(ALL_TYPES)
 
     if show_all:
         filtered_releases = mchecklist.filter_releases(releases, max_len=None)
@@ -253,6 +393,236 @@ def add(
     click.echo(mchecklist.releases_to_string(added_releases, compact=True))
 
 
+@cli.command()
+@click.argument("file", type=click.File("r"))
+@click.option(
+    "--all-releases",
+    is_flag=True,
+    type=bool,
+    default=False,
+    help="Add every release from each artist instead of only the most rated.",
+)
+@click.option(
+    "--popularity-filter",
+    type=float,
+    default=lambda: mchecklist.get_config()["popularity_filter"],
+    help="Only add releases with a certain proportion of the artist's most rated release's ratings.",
+)
+@click.option(
+    "--workers",
+    type=click.IntRange(1, 32),
+    default=MAX_WORKERS,
+    help="How many artist pages to fetch at once.",
+)
+@click.option(
+    "--complete",
+    is_flag=True,
+    type=bool,
+    default=False,
+    help="Open a browser to load any discography sections cut off on the page.",
+)
+def import_artists(
+    file,
+    all_releases=False,
+    popularity_filter=0,
+    workers=MAX_WORKERS,
+    complete=False,
+):
+    """Add releases from every artist in FILE (one artist per line)."""
+
+    import rymapi
+
+    artists = []
+    for line in file:
+        artist = line.strip()
+        if artist and not artist.startswith("#"):
+            artists.append(artist)
+
+    # Each artist is only fetched once, so count them once too
+    artists = [*dict.fromkeys(artists)]
+
+    if not artists:
+        click.echo("No artists found in file.")
+        return
+
+    start = time.perf_counter()
+
+    try:
+        with click.progressbar(length=len(artists), label="Fetching artists") as bar:
+            results, failures = rymapi.get_many_artist_releases(
+                artists,
+                ALL_TYPES,
+                max_workers=workers,
+                progress=lambda artist: bar.update(1),
+                complete=complete,
+            )
+    finally:
+        rymapi.close_browsers()
+
+    to_be_added = []
+    not_found = []
+    for artist, releases in results.items():
+        if releases is None:
+            not_found.append(artist)
+            continue
+        if not releases:
+            continue
+
+        if all_releases:
+            to_be_added += mchecklist.filter_releases(releases, max_len=None)
+        else:
+            to_be_added += mchecklist.filter_releases(
+                releases, pop_filter=popularity_filter
+            )
+
+    was_added = mchecklist.add_releases(to_be_added)
+    elapsed = time.perf_counter() - start
+
+    for artist in not_found:
+        click.echo(f"Artist not found: {artist}")
+    for artist, error in failures.items():
+        click.echo(f"Failed to fetch {artist}: {error}")
+
+    fetched_count = len(results) - len(not_found)
+    click.echo(
+        f"Added {sum(was_added)} new releases from {fetched_count}/{len(artists)} artists "
+        f"in {elapsed:.1f}s ({len(artists) / elapsed:.1f} artists/s)."
+    )
+
+
+@cli.command()
+@click.option(
+    "--workers",
+    type=click.IntRange(1, 32),
+    default=MAX_WORKERS,
+    help="How many artist pages to fetch at once.",
+)
+def refresh(workers=MAX_WORKERS):
+    """Update the ratings and averages of every release in the checklist."""
+
+    if not mchecklist.get_current_store():
+        click.echo(
+            "No checklist is currently selected. Try 'mchecklist create' to create a checklist."
+        )
+        return
+
+    artist_count = len(mchecklist.get_current_checklist().artist_links())
+    start = time.perf_counter()
+
+    with click.progressbar(length=artist_count, label="Refreshing artists") as bar:
+        updated_count, unchanged_count, not_found, failures = (
+            mchecklist.refresh_ratings(
+                max_workers=workers, progress=lambda artist_link: bar.update(1)
+            )
+        )
+
+    elapsed = time.perf_counter() - start
+
+    for artist_link in not_found:
+        click.echo(f"Artist page not found: {artist_link}")
+    for artist_link, error in failures.items():
+        click.echo(f"Failed to fetch {artist_link}: {error}")
+
+    click.echo(
+        f"Refreshed {artist_count} artists in {elapsed:.1f}s: "
+        f"{updated_count} updated, {unchanged_count} unchanged."
+    )
+
+
+@cli.command()
+@click.argument(
+    "directory", type=click.Path(exists=True, file_okay=False, path_type=Path)
+)
+@click.option(
+    "--all-releases",
+    is_flag=True,
+    type=bool,
+    default=False,
+    help="Add every release from each artist instead of only the most rated.",
+)
+@click.option(
+    "--popularity-filter",
+    type=float,
+    default=lambda: mchecklist.get_config()["popularity_filter"],
+    help="Only add releases with a certain proportion of the artist's most rated release's ratings.",
+)
+@click.option(
+    "--workers",
+    type=click.IntRange(1, 64),
+    default=None,
+    help="How many pages to parse at once. Defaults to the number of CPUs.",
+)
+@click.option(
+    "--batch-size",
+    type=click.IntRange(1),
+    default=INGEST_BATCH_SIZE,
+    help="How many releases to add to the checklist at a time.",
+)
+def ingest_html(
+    directory,
+    all_releases=False,
+    popularity_filter=0,
+    workers=None,
+    batch_size=INGEST_BATCH_SIZE,
+):
+    """Add releases from every artist page saved as HTML in DIRECTORY."""
+
+    import rymapi
+
+    paths = sorted(
+        path
+        for path in directory.rglob("*")
+        if path.suffix.lower() in HTML_SUFFIXES and path.is_file()
+    )
+
+    if not paths:
+        click.echo("No HTML pages found in directory.")
+        return
+
+    start = time.perf_counter()
+
+    batch = []
+    added_count = 0
+    parsed_count = 0
+    failures = {}
+
+    with click.progressbar(length=len(paths), label="Parsing pages") as bar:
+        for path, releases, error in rymapi.ingest_pages(paths, ALL_TYPES, workers):
+            bar.update(1)
+
+            if error:
+                failures[path] = error
+                continue
+
+            parsed_count += 1
+            if not releases:
+                continue
+
+            if all_releases:
+                batch += mchecklist.filter_releases(releases, max_len=None)
+            else:
+                batch += mchecklist.filter_releases(
+                    releases, pop_filter=popularity_filter
+                )
+
+            if len(batch) >= batch_size:
+                added_count += sum(mchecklist.add_releases(batch))
+                batch = []
+
+    if batch:
+        added_count += sum(mchecklist.add_releases(batch))
+
+    elapsed = time.perf_counter() - start
+
+    for path, error in failures.items():
+        click.echo(f"Failed to parse {path}: {error}")
+
+    click.echo(
+        f"Added {added_count} new releases from {parsed_count}/{len(paths)} pages "
+        f"in {elapsed:.1f}s ({len(paths) / elapsed:.1f} pages/s)."
+    )
+
+
 @cli.command()
 @click.option("--artist", type=str, help="Change the objective to a different artist.")
 def view(artist: str):
@@ -265,15 +635,7 @@ def view(artist: str):
             click.echo("Artist not in checklist.")
             return
 
-    click.echo(
-        mchecklist.releases_to_string(
-            [
-                mchecklist.dict_to_release(release)
-                for release in mchecklist.CURRENT_CHECKLIST_JSON["viewing"]
-            ],
-            add=False,
-        )
-    )
+    _echo_viewing()
 
 
 @cli.command()
@@ -281,37 +643,26 @@ def view(artist: str):
 def check(choose: str):
     """Mark a release as listened to."""
 
-    if len(mchecklist.CURRENT_CHECKLIST_JSON["viewing"]) == 1:
-        current_release = mchecklist.CURRENT_CHECKLIST_JSON["viewing"][0]
+    if len(mchecklist.get_current_checklist().viewing) == 1:
+        current_release = mchecklist.get_current_checklist().viewing[0]
         mchecklist.check_release(current_release)
         current_title = current_release["title"]
         click.echo(f"{current_title} marked as complete.\n")
         if mchecklist.view_random():
-            if len(mchecklist.CURRENT_CHECKLIST_JSON["viewing"]) == 0:
+            if len(mchecklist.get_current_checklist().viewing) == 0:
                 click.echo(
                     "Checklist complete. Try 'mchecklist add' to add more releases."
                 )
                 return
 
-            click.echo(
-                mchecklist.releases_to_string(
-                    [
-                        mchecklist.dict_to_release(release)
-                        for release in mchecklist.CURRENT_CHECKLIST_JSON["viewing"]
-                    ],
-                    add=False,
-                )
-            )
+            _echo_viewing()
             return
 
-    if len(mchecklist.CURRENT_CHECKLIST_JSON["viewing"]) == 0:
+    if len(mchecklist.get_current_checklist().viewing) == 0:
         click.echo("Not currently viewing any releases.")
         return
 
-    viewing = [
-        mchecklist.dict_to_release(release)
-        for release in mchecklist.CURRENT_CHECKLIST_JSON["viewing"]
-    ]
+    viewing = mchecklist.get_current_checklist().viewing
 
     if not choose:
         click.echo(mchecklist.releases_to_string(viewing, add=False))
@@ -335,23 +686,37 @@ def check(choose: str):
         selected = _parse_selection(choose, viewing)
 
     for i in selected:
-        mchecklist.check_release(mchecklist.release_to_dict(viewing[i]))
+        mchecklist.check_release(viewing[i])
 
-    click.echo(
-        mchecklist.releases_to_string(
-            [
-                mchecklist.dict_to_release(release)
-                for release in mchecklist.CURRENT_CHECKLIST_JSON["viewing"]
-            ],
-            add=False,
-        )
-    )
+    _echo_viewing()
 
 
 @cli.command()
-@click.option("--artist")
-def next():
-    """Fetch a new release."""
+@click.option(
+    "--artist",
+    is_flag=True,
+    help="View every release of a random artist instead of a single release.",
+)
+@click.option(
+    "--pick",
+    type=click.Choice(sampler.MODES),
+    default=sampler.UNIFORM,
+    show_default=True,
+    help="Pick releases uniformly, artists uniformly, or by number of ratings.",
+)
+def next(artist=False, pick=sampler.UNIFORM):
+    """Fetch a new release by an artist that isn't being viewed."""
+
+    if artist:
+        changed = mchecklist.view_random_artist(pick)
+    else:
+        changed = mchecklist.view_random(pick, new_artist=True)
+
+    if not changed:
+        click.echo("No other to-do releases. Try 'mchecklist add' to add more releases.")
+        return
+
+    _echo_viewing()
 
 
 @cli.command()
@@ -371,6 +736,8 @@ def remove_release(release: str, artist: str):
 
 @cli.command()
 def test():
+    import rymapi
+
     releases1 = rymapi.get_artist_releases("Sematary-1", ["album", "ep", "mixtape"])
     releases2 = rymapi.get_artist_releases("Aphex Twin", ["album", "ep", "mixtape"])
     print(mchecklist.releases_to_string(releases2 + releases1))
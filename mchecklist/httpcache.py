@@ -0,0 +1,152 @@
+import collections
+import hashlib
+import json
+import os
+import tempfile
+import time
+from pathlib import Path
+from typing import Dict, Optional
+
+
+CacheEntry = collections.namedtuple(
+    "CacheEntry", ["content", "etag", "last_modified", "fetched", "fresh"]
+)
+
+
+def _atomic_write(path: Path, data: bytes) -> None:
+    # A temp file of its own, so concurrent writers of one path don't collide
+    with tempfile.NamedTemporaryFile(
+        dir=path.parent, prefix=path.name, suffix=".tmp", delete=False
+    ) as temp_file:
+        temp_file.write(data)
+
+    try:
+        os.replace(temp_file.name, path)
+    except OSError:
+        Path(temp_file.name).unlink(missing_ok=True)
+        raise
+
+
+class ResponseCache:
+    """On-disk cache of HTTP response bodies, keyed by a hash of the URL.
+
+    Entries older than TTL seconds are stale and must be revalidated with the
+    stored ETag/Last-Modified validators. Once the bodies take up more than
+    MAX_SIZE bytes, the least recently used entries are evicted.
+    """
+
+    def __init__(self, directory: Path, ttl: float, max_size: int):
+        self.directory = Path(directory)
+        self.ttl = ttl
+        self.max_size = max_size
+
+    def _paths(self, url: str) -> (Path, Path):
+        key = hashlib.sha256(url.encode("utf-8")).hexdigest()
+        return (
+            self.directory.joinpath(f"{key}.html"),
+            self.directory.joinpath(f"{key}.json"),
+        )
+
+    def get(self, url: str) -> Optional[CacheEntry]:
+        """Return the cached response for URL, fresh or stale, if there is one."""
+
+        body_path, meta_path = self._paths(url)
+
+        now = time.time()
+        try:
+            with open(meta_path) as meta_file:
+                meta = json.load(meta_file)
+            with open(body_path, "rb") as body_file:
+                content = body_file.read()
+
+            # Bump the modification time so eviction sees this entry as recently used
+            os.utime(body_path, (now, now))
+        except (OSError, ValueError):
+            # Including entries evicted by another thread or process meanwhile
+            return None
+
+        return CacheEntry(
+            content,
+            meta.get("etag"),
+            meta.get("last_modified"),
+            meta["fetched"],
+            now - meta["fetched"] < self.ttl,
+        )
+
+    def validators(self, entry: CacheEntry) -> Dict[str, str]:
+        """Conditional request headers for revalidating a stale entry."""
+
+        headers = {}
+        if entry.etag:
+            headers["If-None-Match"] = entry.etag
+        if entry.last_modified:
+            headers["If-Modified-Since"] = entry.last_modified
+
+        return headers
+
+    def put(
+        self,
+        url: str,
+        content: bytes,
+        etag: Optional[str] = None,
+        last_modified: Optional[str] = None,
+    ) -> None:
+        self.directory.mkdir(parents=True, exist_ok=True)
+        body_path, meta_path = self._paths(url)
+
+        meta = {
+            "url": url,
+            "etag": etag,
+            "last_modified": last_modified,
+            "fetched": time.time(),
+            "size": len(content),
+        }
+
+        _atomic_write(body_path, content)
+        _atomic_write(meta_path, json.dumps(meta).encode("utf-8"))
+
+        self.evict()
+
+    def refresh(self, url: str) -> None:
+        """Mark an entry as fresh again after a 304 Not Modified response."""
+
+        _, meta_path = self._paths(url)
+
+        try:
+            with open(meta_path) as meta_file:
+                meta = json.load(meta_file)
+        except (OSError, ValueError):
+            return
+
+        meta["fetched"] = time.time()
+        _atomic_write(meta_path, json.dumps(meta).encode("utf-8"))
+
+    def evict(self) -> None:
+        """Delete least recently used entries until the cache fits in MAX_SIZE."""
+
+        bodies = []
+        total_size = 0
+        for body_path in self.directory.glob("*.html"):
+            try:
+                stat = body_path.stat()
+            except FileNotFoundError:
+                # Evicted by another thread or process since the glob
+                continue
+            bodies.append((stat.st_mtime, stat.st_size, body_path))
+            total_size += stat.st_size
+
+        if total_size <= self.max_size:
+            return
+
+        bodies.sort()
+        for _, size, body_path in bodies:
+            if total_size <= self.max_size:
+                break
+
+            body_path.unlink(missing_ok=True)
+            body_path.with_suffix(".json").unlink(missing_ok=True)
+            total_size -= size
+
+    def clear(self) -> None:
+        for path in self.directory.glob("*.*"):
+            path.unlink(missing_ok=True)
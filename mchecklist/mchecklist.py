@@ -1,50 +1,67 @@
 import json
 from pathlib import Path
-from typing import Optional, Dict, List
+from typing import Optional, Dict, List, Iterable, Iterator, TextIO, Tuple
+import functools
+import heapq
+import time
+import itertools
 import re
-import random
-import os
-from rymapi import Artist, Release
-import rymapi
+from release import Artist, Release
+import storage
+from checklist import Checklist
+import profiling
+import sampler
 
 
 SOURCE_DIR = Path(__file__).resolve().parent
-os.chdir(SOURCE_DIR)
 
 CHECKLIST_DIR = SOURCE_DIR.joinpath("checklists")
 CONFIG_FILE = SOURCE_DIR.joinpath("config.json")
 
-if not CONFIG_FILE.exists():
-    config_json = {
-        "current": "",
-        "popularity_filter": 0,
-        "show_ratings": False,
-        "show_average": False,
-    }
-    with open(CONFIG_FILE, "w") as config_file:
-        config_file.write(json.dumps(config_json, indent=2))
+DEFAULT_CONFIG = {
+    "current": "",
+    "popularity_filter": 0,
+    "show_ratings": False,
+    "show_average": False,
+}
+
+CHAR_CAP = 40
 
-with open(CONFIG_FILE) as config_file:
-    CONFIG_JSON = json.load(config_file)
 
-CURRENT_CHECKLIST = CONFIG_JSON["current"]
-CURRENT_CHECKLIST_FILE = f"checklists/{CURRENT_CHECKLIST}.json"
+@functools.cache
+def get_config() -> Dict:
+    """Load config.json, creating it with the default settings if needed."""
 
-with open(CURRENT_CHECKLIST_FILE) as current_checklist:
-    CURRENT_CHECKLIST_JSON = json.load(current_checklist)
+    if not CONFIG_FILE.exists():
+        _write_to_config(DEFAULT_CONFIG)
 
-POP_FILTER = float(CONFIG_JSON["popularity_filter"])
-SHOW_RATINGS = CONFIG_JSON["show_ratings"]
-SHOW_AVERAGE = CONFIG_JSON["show_average"]
+    with open(CONFIG_FILE) as config_file:
+        return json.load(config_file)
+
+
+@functools.cache
+def get_current_store():
+    return storage.find_store(CHECKLIST_DIR, get_config()["current"])
 
-CHAR_CAP = 40
 
+@functools.cache
+def get_current_checklist() -> Checklist:
+    """Load the current checklist the first time it's needed."""
 
-def _get_checklist_path(name: str) -> Optional[Path]:
-    if checklist_exists(name):
-        return CHECKLIST_DIR.joinpath(f"{name}.json")
+    current_store = get_current_store()
+
+    if current_store:
+        return Checklist(current_store.load())
     else:
-        return None
+        return Checklist(storage.empty_checklist())
+
+
+def _get_checklist_store(name: str):
+    # Reuse the open store so renames and deletes see its connection
+    if name == get_config()["current"] and get_current_store():
+        return get_current_store()
+
+    return storage.find_store(CHECKLIST_DIR, name)
 
 
 def _write_to_config(config_json) -> None:
@@ -80,6 +97,8 @@ def release_to_dict(release: Release) -> Dict:
         "artist_link": release.artist_link,
         "year": release.year,
         "type": release.type,
+        "ratings": release.ratings,
+        "average": release.average,
     }
 
 
@@ -89,19 +108,19 @@ def dict_to_release(dict: Dict) -> Release:
         dict["title"],
         dict["link"],
         dict["artist_link"],
-        None,
-        None,
+        dict.get("ratings"),
+        dict.get("average"),
         dict["year"],
         dict["type"],
     )
 
 
 def checklist_exists(checklist_name: str) -> bool:
-    return CHECKLIST_DIR.joinpath(f"{checklist_name}.json").exists()
+    return _get_checklist_store(checklist_name) is not None
 
 
-def init_checklist(name="", genres=["All"]) -> Optional[str]:
-    """Create a new JSON file for a checklist. Called by create."""
+def init_checklist(name="", genres=["All"], use_sqlite=False) -> Optional[str]:
+    """Create a new JSON file (or SQLite database) for a checklist. Called by create."""
 
     CHECKLIST_DIR.mkdir(exist_ok=True)
 
@@ -111,7 +130,6 @@ def init_checklist(name="", genres=["All"]) -> Optional[str]:
         while checklist_exists(f"checklist{counter}"):
             counter += 1
 
-        open(CHECKLIST_DIR.joinpath(f"checklist{counter}.json"), "x")
         returned_name = f"checklist{counter}"
     else:
         sanitized_name = sanitize(name)
@@ -120,25 +138,22 @@ def init_checklist(name="", genres=["All"]) -> Optional[str]:
         if checklist_exists(sanitized_name):
             return None
 
-        open(CHECKLIST_DIR.joinpath(f"{sanitized_name}.json"), "x")
         returned_name = sanitized_name
 
     # Edit config
-    if SOURCE_DIR.joinpath("config.json").exists():
-        with open(CONFIG_FILE) as config_file:
-            config_json = json.load(config_file)
-    else:
-        config_json = {}
-
+    config_json = get_config()
     config_json["current"] = returned_name
 
     _write_to_config(config_json)
+    get_current_store.cache_clear()
+    get_current_checklist.cache_clear()
 
-    # Edit new checklist
-    checklist_json = {"viewing": [], "to-do": [], "completed": []}
-
-    with open(CHECKLIST_DIR.joinpath(f"{returned_name}.json"), "w") as checklist_file:
-        checklist_file.write(json.dumps(checklist_json, indent=2))
+    # Create new checklist
+    store_class = storage.SqliteStore if use_sqlite else storage.JsonStore
+    store = store_class.create(
+        CHECKLIST_DIR.joinpath(f"{returned_name}{store_class.suffix}")
+    )
+    store.close()
 
     return returned_name
 
@@ -146,17 +161,19 @@ def init_checklist(name="", genres=["All"]) -> Optional[str]:
 def rename_checklist(old_name: str, new_name: str) -> Optional[str]:
     """Renames a checklist's JSON file. Called by edit."""
 
-    checklist_path = _get_checklist_path(old_name)
+    checklist_store = _get_checklist_store(old_name)
 
-    if not checklist_path:
+    if not checklist_store:
         return None
 
     sanitized_new_name = sanitize(new_name)
 
     if not checklist_exists(sanitized_new_name):
-        checklist_path.rename(f"{sanitized_new_name}.json")
+        checklist_store.rename(
+            CHECKLIST_DIR.joinpath(f"{sanitized_new_name}{checklist_store.suffix}")
+        )
 
-        config_json = CONFIG_JSON
+        config_json = get_config()
         if config_json["current"] == old_name:
             config_json["current"] = sanitized_new_name
             _write_to_config(config_json)
@@ -169,12 +186,12 @@ def rename_checklist(old_name: str, new_name: str) -> Optional[str]:
 def delete_checklist(name: str) -> Optional[str]:
     """Deletes a checklist's JSON file. Called by delete."""
 
-    checklist_path = _get_checklist_path(name)
+    checklist_store = _get_checklist_store(name)
 
-    if checklist_path:
-        checklist_path.unlink()
+    if checklist_store:
+        checklist_store.delete()
 
-        config_json = CONFIG_JSON
+        config_json = get_config()
 
         if config_json["current"] == name:
             config_json["current"] == ""
@@ -185,146 +202,188 @@ def delete_checklist(name: str) -> Optional[str]:
         return None
 
 
-def filter_releases(releases: List[Release], max_len=15, pop_filter=0):
-    """Returns a new list with only the MAX_LEN releases with the highest ratings."""
+def _year_sort_key(year) -> float:
+    """Releases without a year ("N/A") sort after every dated one."""
+
+    return int(year) if str(year).isdigit() else float("inf")
 
-    releases_copy = releases.copy()
+
+@profiling.timed("filter")
+def filter_releases(releases: Iterable[Release], max_len=15, pop_filter=0):
+    """Returns a new list with only the MAX_LEN releases with the highest ratings."""
 
     if pop_filter and pop_filter <= 1:
-        highest_ratings_release = max(releases_copy, key=lambda x: int(x.ratings))
-
-        bound = len(releases_copy)
-        i = 0
-        while i < bound:
-            release = releases_copy[i]
-            if int(release.ratings) < pop_filter * int(highest_ratings_release.ratings):
-                releases_copy.remove(release)
-                bound -= 1
-            else:
-                i += 1
-
-    if not max_len == None and len(releases_copy) > max_len:
-        filtered_releases: List[Release] = []
-        while len(filtered_releases) < max_len:
-            highest_ratings_release = max(releases_copy, key=lambda x: int(x.ratings))
-            filtered_releases.append(highest_ratings_release)
-            releases_copy.remove(highest_ratings_release)
+        releases = list(releases)
+        if releases:
+            highest_ratings = max(int(release.ratings) for release in releases)
+            releases = [
+                release
+                for release in releases
+                if int(release.ratings) >= pop_filter * highest_ratings
+            ]
+
+    if max_len == None:
+        filtered_releases = list(releases)
     else:
-        filtered_releases = releases_copy
+        # Ask for one extra release to find out whether any had to be cut
+        highest_ratings = heapq.nlargest(
+            max_len + 1, enumerate(releases), key=lambda x: int(x[1].ratings)
+        )
+
+        # Cut lists stay in ratings order, uncut ones in their original order
+        if len(highest_ratings) > max_len:
+            highest_ratings = highest_ratings[:max_len]
+        else:
+            highest_ratings.sort(key=lambda x: x[0])
+
+        filtered_releases = [release for _, release in highest_ratings]
 
-    filtered_releases.sort(key=lambda x: int(x.year))
-    filtered_releases.sort(key=lambda x: x.type)
+    filtered_releases.sort(key=lambda x: (x.type, _year_sort_key(x.year)))
 
     return filtered_releases
 
 
-def releases_to_string(
-    releases: List[Release],
-    show_ratings=SHOW_RATINGS,
-    show_average=SHOW_AVERAGE,
-    compact=False,
-    add=True,
-) -> str:
-    """Converts a list of releases to a readable string."""
+def _group_releases(releases: Iterable[Release], grouped: bool):
+    """Yield (artist, [(type, releases), ...]) in display order."""
 
-    releases_string: str = ""
-    type_dict = {"album": [], "ep": [], "mixtape": []}
-    artist_dict = {}
+    if grouped:
+        for artist, artist_releases in itertools.groupby(
+            releases, key=lambda x: x.artist
+        ):
+            yield artist, itertools.groupby(artist_releases, key=lambda x: x.type)
+        return
 
+    artist_dict = {}
     for release in releases:
-        dupe = False
-        for artist in artist_dict:
-            if artist == release.artist:
-                dupe = True
-
-        if not dupe:
+        if release.artist not in artist_dict:
             artist_dict[release.artist] = {"album": [], "ep": [], "mixtape": []}
 
         artist_dict[release.artist][release.type].append(release)
 
+    for artist, type_dict in artist_dict.items():
+        yield artist, type_dict.items()
+
+
+def iter_release_lines(
+    releases: Iterable[Release],
+    show_ratings=None,
+    show_average=None,
+    compact=False,
+    add=True,
+    grouped=False,
+) -> Iterator[str]:
+    """Yields the lines of a readable listing of releases as they're made.
+
+    With GROUPED, RELEASES must already be ordered by artist and then type,
+    and are rendered without being buffered first.
+    """
+
+    if show_ratings == None:
+        show_ratings = get_config()["show_ratings"]
+    if show_average == None:
+        show_average = get_config()["show_average"]
+
+    # Key views of the link-indexed dicts, so each status check is O(1)
+    checklist = get_current_checklist()
+    completed_links = checklist.completed.keys()
+    todo_links = checklist.todo.keys()
+
     increment = 1
-    for artist in artist_dict:
-        if not compact and len(releases_string) == 0:
-            releases_string += artist
+    for artist, type_groups in _group_releases(releases, grouped):
+        if not compact and increment == 1:
+            yield artist
         elif not compact:
-            releases_string += f"\n\n{artist[:CHAR_CAP]}"
-
-        for type_list in artist_dict[artist].items():
-            type_name = _capitalize_release_type(type_list[0])
-            releases = type_list[1]
-
-            if not compact and len(releases) > 0:
-                releases_string += f"\n  {type_name}"
-
-            for release in releases:
-                if not compact:
-                    releases_string += (
-                        f"\n%2d  {release.title[:CHAR_CAP]} [{release.year}]"
-                        % (increment)
-                    )
-                    increment += 1
-
-                    if show_ratings and add:
-                        releases_string += f": {release.ratings} ratings"
-                    if show_average and add:
-                        releases_string += f" ({release.average})"
-                    if release_to_dict(release) in CURRENT_CHECKLIST_JSON["completed"]:
-                        releases_string += " (Completed)"
-                    if (
-                        release_to_dict(release) in CURRENT_CHECKLIST_JSON["to-do"]
-                        and add == True
-                    ):
-                        releases_string += " (In Checklist)"
-                else:
-                    new_line = "\n"
-                    if len(releases_string) == 0:
-                        new_line = ""
-                    releases_string += f"{new_line}{release.artist[:CHAR_CAP]} - {release.title[:CHAR_CAP]} [{release.year}]"
-
-    return releases_string
-
-
-def add_releases(releases: List[Release]) -> List[bool]:
-    """Add a release entry to the current checklist."""
-
-    added = []
-    for release in releases:
-        added.append(add_release(release))
+            yield ""
+            yield artist[:CHAR_CAP]
 
-    return added
+        for release_type, type_releases in type_groups:
+            type_name = _capitalize_release_type(release_type)
+            type_header = not compact
 
+            for release in type_releases:
+                if compact:
+                    yield f"{release.artist[:CHAR_CAP]} - {release.title[:CHAR_CAP]} [{release.year}]"
+                    continue
 
-def add_release(release: Release) -> bool:
-    """Adds a release to 'to-do'"""
+                if type_header:
+                    yield f"  {type_name}"
+                    type_header = False
+
+                line = f"%2d  {release.title[:CHAR_CAP]} [{release.year}]" % (
+                    increment
+                )
+                increment += 1
+
+                # Saved releases only have ratings once they've been refreshed
+                if show_ratings and release.ratings is not None:
+                    line += f": {release.ratings} ratings"
+                if show_average and release.average is not None:
+                    line += f" ({release.average})"
+                if release.link in completed_links:
+                    line += " (Completed)"
+                if release.link in todo_links and add == True:
+                    line += " (In Checklist)"
 
-    releases_list: List[Release] = (
-        CURRENT_CHECKLIST_JSON["to-do"] + CURRENT_CHECKLIST_JSON["completed"]
+                yield line
+
+
+@profiling.timed("render")
+def write_releases(stream: TextIO, releases: Iterable[Release], **kwargs) -> None:
+    """Writes a readable listing of releases to STREAM line by line."""
+
+    for line in iter_release_lines(releases, **kwargs):
+        stream.write(line + "\n")
+
+
+@profiling.timed("render")
+def releases_to_string(
+    releases: Iterable[Release],
+    show_ratings=None,
+    show_average=None,
+    compact=False,
+    add=True,
+) -> str:
+    """Converts a list of releases to a readable string."""
+
+    return "\n".join(
+        iter_release_lines(releases, show_ratings, show_average, compact, add)
     )
 
-    dupe = False
-    for release_entry in releases_list:
-        if release.link == release_entry["link"]:
-            dupe = True
 
-    if dupe:
-        return False
+def add_releases(releases: Iterable[Release]) -> List[bool]:
+    """Add release entries to the current checklist, saving them all at once.
 
-    todo_list: List[Release] = CURRENT_CHECKLIST_JSON["to-do"]
-    todo_list.append(release_to_dict(release))
+    Returns whether each release was added, i.e. wasn't already in the
+    checklist or earlier in RELEASES.
+    """
 
-    # edited_checklist_json = CURRENT_CHECKLIST_JSON.copy()
-    # edited_checklist_json["to-do"] = todo_list
-    with open(CURRENT_CHECKLIST_FILE, "w") as checklist:
-        checklist.write(json.dumps(CURRENT_CHECKLIST_JSON, indent=2))
+    checklist = get_current_checklist()
 
-    return True
+    release_entries = [release_to_dict(release) for release in releases]
+    added = checklist.add_many(release_entries)
+
+    added_entries = [
+        release_entry
+        for release_entry, was_added in zip(release_entries, added)
+        if was_added
+    ]
+    if added_entries:
+        get_current_store().add(checklist, added_entries)
+
+    return added
+
+
+def add_release(release: Release) -> bool:
+    """Adds a release to 'to-do'"""
+
+    return add_releases([release])[0]
 
 
 def list_checklists(mark_current=True) -> Optional[List]:
     """Returns a list of checklist names from the checklists folder."""
 
     checklist_list = []
-    config_json = CONFIG_JSON
+    config_json = get_config()
 
     if not CHECKLIST_DIR.exists():
         return None
@@ -333,7 +392,10 @@ def list_checklists(mark_current=True) -> Optional[List]:
         if not checklist.is_file():
             continue
 
-        checklist_name = checklist.name.strip(".json")
+        if not checklist.suffix in [".json", ".db"]:
+            continue
+
+        checklist_name = checklist.stem
 
         if mark_current and checklist_name == config_json["current"]:
             checklist_list.append(f"{checklist_name} (Current)")
@@ -346,72 +408,162 @@ def list_checklists(mark_current=True) -> Optional[List]:
 def view_artist(artist: str) -> bool:
     """Place an artist's releases in 'viewing'"""
 
-    artist_link = ""
-    for release in (
-        CURRENT_CHECKLIST_JSON["to-do"] + CURRENT_CHECKLIST_JSON["completed"]
-    ):
-        if release["artist"].lower() == artist.lower():
-            artist_link = release["artist_link"]
-            break
-
-    viewing = []
-    for release in (
-        CURRENT_CHECKLIST_JSON["to-do"] + CURRENT_CHECKLIST_JSON["completed"]
-    ):
-        if release["artist_link"] == artist_link:
-            viewing.append(release)
-
-    if not viewing:
+    checklist = get_current_checklist()
+
+    artist_link = checklist.artist_link(artist)
+    if not artist_link:
         return False
 
-    viewing.sort(key=lambda x: int(x["year"]))
+    _view_artist_link(checklist, artist_link)
+
+    return True
+
+
+def _view_artist_link(checklist: Checklist, artist_link: str) -> None:
+    viewing = checklist.artist_entries(artist_link)
+
+    viewing.sort(key=lambda x: _year_sort_key(x["year"]))
     viewing.sort(key=lambda x: x["type"])
 
-    CURRENT_CHECKLIST_JSON["viewing"] = viewing
+    checklist.viewing = viewing
 
-    with open(CURRENT_CHECKLIST_FILE, "w") as current_checklist:
-        current_checklist.write(json.dumps(CURRENT_CHECKLIST_JSON, indent=2))
+    get_current_store().view(checklist, viewing)
 
-    return True
 
+def view_random(mode=sampler.UNIFORM, new_artist=False) -> bool:
+    """Place a random to-do release in 'viewing'.
 
-def view_random() -> bool:
-    if len(CURRENT_CHECKLIST_JSON["to-do"]) == 0:
+    MODE is one of sampler.MODES. With NEW_ARTIST, releases by the artists
+    currently being viewed are skipped.
+    """
+
+    checklist = get_current_checklist()
+
+    exclude_artists = (
+        {release.artist_link for release in checklist.viewing} if new_artist else ()
+    )
+    random_release = checklist.sampler.pick(mode, exclude_artists)
+    if random_release is None:
         return False
 
-    random_release = [random.choice(CURRENT_CHECKLIST_JSON["to-do"])]
-    CURRENT_CHECKLIST_JSON["viewing"] = random_release
+    checklist.viewing = [random_release]
 
-    with open(CURRENT_CHECKLIST_FILE, "w") as current_checklist:
-        current_checklist.write(json.dumps(CURRENT_CHECKLIST_JSON, indent=2))
+    get_current_store().view(checklist, checklist.viewing)
 
     return True
 
 
-def view_random_artist():
-    while True:
-        random_release = random.choice(CURRENT_CHECKLIST_JSON["to-do"])
-        random_artist_link = random_release["artist_link"]
+def view_random_artist(mode=sampler.BY_ARTIST) -> bool:
+    """Place the releases of a random artist not currently being viewed in 'viewing'.
 
-        for release in CURRENT_CHECKLIST_JSON["viewing"]:
-            if release["artist_link"] == random_artist_link:
-                continue
-        else:
-            break
+    The artist is the one of a release picked with MODE.
+    """
+
+    checklist = get_current_checklist()
+
+    exclude_artists = {release.artist_link for release in checklist.viewing}
+    random_release = checklist.sampler.pick(mode, exclude_artists)
+    if random_release is None:
+        return False
+
+    _view_artist_link(checklist, random_release.artist_link)
+
+    return True
 
 
 def check_release(release: Dict):
     """Moves a release from to-do to completed"""
 
-    if not release in CURRENT_CHECKLIST_JSON["to-do"]:
+    checklist = get_current_checklist()
+    checked_release = checklist.check(release["link"])
+
+    if not checked_release:
+        return False
+
+    get_current_store().check(checklist, [checked_release])
+
+    return True
+
+
+def refresh_ratings(
+    max_workers=8, progress=None
+) -> Tuple[int, int, List[str], Dict[str, Exception]]:
+    """Update the ratings of every release in the current checklist. Called by refresh.
+
+    Every artist page is fetched again with a conditional request, and pages
+    whose discography hasn't changed since the last refresh aren't parsed
+    again. Returns how many artists were updated and unchanged, the artist
+    links that weren't found and the ones that failed.
+    """
+
+    import rymapi
+
+    checklist = get_current_checklist()
+
+    previous_hashes = {
+        artist_link: checklist.artist_pages.get(artist_link, {}).get("hash")
+        for artist_link in checklist.artist_links()
+    }
+    results, failures = rymapi.refresh_discographies(
+        previous_hashes, max_workers, progress
+    )
+
+    refreshed = time.time()
+    updated_entries = []
+    artist_pages = {}
+    updated_count = 0
+    unchanged_count = 0
+    not_found = []
+
+    for artist_link, (content_hash, discography) in results.items():
+        if content_hash is None:
+            not_found.append(artist_link)
+            continue
+
+        artist_pages[artist_link] = {"hash": content_hash, "refreshed": refreshed}
+
+        if discography is None:
+            unchanged_count += 1
+            continue
+
+        updated_count += 1
+        for entry in checklist.artist_entries(artist_link):
+            release = discography.find_link(entry["link"])
+            if release:
+                checklist.set_ratings(entry["link"], release.ratings, release.average)
+                updated_entries.append(entry)
+
+    checklist.artist_pages.update(artist_pages)
+    if artist_pages:
+        get_current_store().refresh(checklist, updated_entries, artist_pages)
+
+    return updated_count, unchanged_count, not_found, failures
+
+
+def compact_checklist() -> bool:
+    """Fold the current checklist's pending changes into its file. Called by compact."""
+
+    if not get_current_store():
         return False
 
-    CURRENT_CHECKLIST_JSON["completed"].append(release)
-    CURRENT_CHECKLIST_JSON["to-do"].remove(release)
+    get_current_store().compact(get_current_checklist())
+
+    return True
+
+
+def migrate_checklist(name: str) -> bool:
+    """Move a JSON checklist into an SQLite database. Called by migrate."""
+
+    checklist_store = _get_checklist_store(name)
+
+    if not isinstance(checklist_store, storage.JsonStore):
+        return False
+
+    storage.migrate_to_sqlite(checklist_store)
+
+    if name == get_config()["current"]:
+        get_current_store.cache_clear()
 
-    with open(CURRENT_CHECKLIST_FILE, "w") as checklist:
-        checklist.write(json.dumps(CURRENT_CHECKLIST_JSON, indent=2))
-    
     return True
 
 
@@ -421,6 +573,8 @@ def sanitize(string: str) -> str:
 
 # Debug
 if __name__ == "__main__":
+    import rymapi
+
     releases1 = rymapi.get_artist_releases("Sematary-1", ["album", "ep", "mixtape"])
     releases2 = rymapi.get_artist_releases("Aphex Twin", ["album", "ep", "mixtape"])
     print(releases_to_string(releases2 + releases1))
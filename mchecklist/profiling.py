@@ -0,0 +1,93 @@
+import contextlib
+import functools
+import threading
+import time
+from typing import Callable, Dict, Iterator, List
+
+
+# Off unless the --profile option turns it on, so spans cost next to nothing
+ENABLED = False
+
+_spans: Dict[str, List[float]] = {}
+_counters: Dict[str, int] = {}
+_lock = threading.Lock()
+
+
+def enable() -> None:
+    global ENABLED
+    ENABLED = True
+
+
+def reset() -> None:
+    with _lock:
+        _spans.clear()
+        _counters.clear()
+
+
+@contextlib.contextmanager
+def span(name: str) -> Iterator[None]:
+    """Add the time spent inside the block to the phase NAME."""
+
+    if not ENABLED:
+        yield
+        return
+
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        with _lock:
+            totals = _spans.setdefault(name, [0.0, 0])
+            totals[0] += elapsed
+            totals[1] += 1
+
+
+def timed(name: str) -> Callable:
+    """Decorator that records every call to a function as the phase NAME."""
+
+    def decorator(function: Callable) -> Callable:
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            if not ENABLED:
+                return function(*args, **kwargs)
+
+            with span(name):
+                return function(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+def count(name: str, amount=1) -> None:
+    if not ENABLED:
+        return
+
+    with _lock:
+        _counters[name] = _counters.get(name, 0) + amount
+
+
+def summary() -> str:
+    """A table of every phase's total time and call count, then the counters.
+
+    Phases can nest (picking user agents happens inside the first request),
+    and ones run from several threads at once add up, so the totals can be
+    more than the wall time.
+    """
+
+    lines = [f"{'phase':<20} {'total ms':>10} {'calls':>7} {'mean ms':>9}"]
+    with _lock:
+        for name, (total, calls) in sorted(
+            _spans.items(), key=lambda x: x[1][0], reverse=True
+        ):
+            lines.append(
+                f"{name:<20} {total * 1000:10.1f} {calls:7d} {total * 1000 / calls:9.2f}"
+            )
+
+        if _counters:
+            lines.append("")
+            for name, value in sorted(_counters.items()):
+                lines.append(f"{name:<20} {value:10d}")
+
+    return "\n".join(lines)
@@ -0,0 +1,203 @@
+import array
+import collections
+import sys
+from typing import Dict, List, Optional, Tuple
+
+
+Release = collections.namedtuple(
+    "Release",
+    ["artist", "title", "link", "artist_link", "ratings", "average", "year", "type"],
+)
+
+Artist = collections.namedtuple("Artist", ["name", "releases"])
+
+
+RELEASE_TYPES = ["album", "ep", "mixtape", "dj-mix", "single", "compilation", "bootleg"]
+ENTRY_KEYS = [
+    "artist",
+    "title",
+    "link",
+    "artist_link",
+    "year",
+    "type",
+    "ratings",
+    "average",
+]
+NO_YEAR = -1
+NO_RATINGS = -1
+
+
+class ReleaseRecord:
+    """A release stored in a ReleaseTable, made when it's asked for.
+
+    Has the attributes of a Release, so it can be rendered as one, and can
+    be indexed like the entry dict it was made from. The table doesn't keep
+    links, so the record carries its own.
+    """
+
+    __slots__ = ("_table", "_row", "link")
+
+    def __init__(self, table: "ReleaseTable", row: int, link: str):
+        self._table = table
+        self._row = row
+        self.link = link
+
+    @property
+    def artist(self) -> str:
+        return self._table.artists[self._table.artist_ids[self._row]][0]
+
+    @property
+    def artist_link(self) -> str:
+        return self._table.artist_link(self._row)
+
+    @property
+    def title(self) -> str:
+        return self._table.title(self._row)
+
+    @property
+    def year(self):
+        year = self._table.years[self._row]
+        return "N/A" if year == NO_YEAR else year
+
+    @property
+    def type(self) -> str:
+        return self._table.type(self._row)
+
+    @property
+    def ratings(self) -> Optional[int]:
+        return self._table.ratings_of(self._row)
+
+    @property
+    def average(self) -> Optional[float]:
+        if self._table.ratings[self._row] == NO_RATINGS:
+            return None
+        return self._table.averages[self._row]
+
+    def __getitem__(self, key: str):
+        if key not in ENTRY_KEYS:
+            raise KeyError(key)
+
+        return getattr(self, key)
+
+    def __eq__(self, other) -> bool:
+        return (
+            isinstance(other, ReleaseRecord)
+            and self._table is other._table
+            and self._row == other._row
+        )
+
+    def __hash__(self) -> int:
+        return hash(self._row)
+
+    def to_dict(self) -> Dict:
+        table = self._table
+        row = self._row
+        artist, artist_link = table.artists[table.artist_ids[row]]
+        ratings = table.ratings_of(row)
+
+        return {
+            "artist": artist,
+            "title": table.title(row),
+            "link": self.link,
+            "artist_link": artist_link,
+            "year": self.year,
+            "type": table.type(row),
+            "ratings": ratings,
+            "average": None if ratings is None else table.averages[row],
+        }
+
+    def __repr__(self) -> str:
+        return f"ReleaseRecord({self.to_dict()!r})"
+
+
+class ReleaseTable:
+    """Release entries packed into columns, one row per release.
+
+    Titles are kept as UTF-8 in one buffer, each artist and artist link is
+    kept once and referred to by index, release types are small codes and
+    years, ratings and averages sit in typed arrays, so a row costs little
+    more than its title's bytes. Links aren't kept here: whoever owns the
+    rows maps links to row numbers, and makes records with record().
+    """
+
+    def __init__(self):
+        self._title_data = bytearray()
+        self._title_ends = array.array("Q")
+        self.artist_ids = array.array("I")
+        self.type_codes = array.array("B")
+        self.years = array.array("h")
+        self.ratings = array.array("i")
+        self.averages = array.array("d")
+        self.artists: List[Tuple[str, str]] = []
+        self.types: List[str] = list(RELEASE_TYPES)
+        self._artist_ids: Dict[Tuple[str, str], int] = {}
+        self._type_codes = {release_type: i for i, release_type in enumerate(self.types)}
+
+    def __len__(self) -> int:
+        return len(self.years)
+
+    def _artist_id(self, artist: str, artist_link: str) -> int:
+        key = (artist, artist_link)
+        artist_id = self._artist_ids.get(key)
+
+        if artist_id is None:
+            artist_id = len(self.artists)
+            self.artists.append((sys.intern(artist), sys.intern(artist_link)))
+            self._artist_ids[self.artists[-1]] = artist_id
+
+        return artist_id
+
+    def _type_code(self, release_type: str) -> int:
+        type_code = self._type_codes.get(release_type)
+
+        if type_code is None:
+            type_code = len(self.types)
+            self.types.append(release_type)
+            self._type_codes[release_type] = type_code
+
+        return type_code
+
+    def title(self, row: int) -> str:
+        start = self._title_ends[row - 1] if row else 0
+        return self._title_data[start : self._title_ends[row]].decode("utf-8")
+
+    def artist_link(self, row: int) -> str:
+        return self.artists[self.artist_ids[row]][1]
+
+    def type(self, row: int) -> str:
+        return self.types[self.type_codes[row]]
+
+    def ratings_of(self, row: int) -> Optional[int]:
+        ratings = self.ratings[row]
+        return None if ratings == NO_RATINGS else ratings
+
+    def record(self, row: int, link: str) -> ReleaseRecord:
+        return ReleaseRecord(self, row, link)
+
+    def append(self, entry: Dict) -> int:
+        """Store an entry dict and return its row."""
+
+        year = entry["year"]
+        row = len(self.years)
+
+        self._title_data += entry["title"].encode("utf-8")
+        self._title_ends.append(len(self._title_data))
+        self.artist_ids.append(self._artist_id(entry["artist"], entry["artist_link"]))
+        self.type_codes.append(self._type_code(entry["type"]))
+        self.years.append(int(year) if str(year).isdigit() else NO_YEAR)
+        self.ratings.append(NO_RATINGS)
+        self.averages.append(0.0)
+
+        self.set_ratings(row, entry.get("ratings"), entry.get("average"))
+
+        return row
+
+    def set_ratings(
+        self, row: int, ratings: Optional[int], average: Optional[float]
+    ) -> None:
+        if ratings is None or average is None:
+            self.ratings[row] = NO_RATINGS
+            self.averages[row] = 0.0
+        else:
+            self.ratings[row] = int(ratings)
+            self.averages[row] = float(average)
@@ -0,0 +1,1073 @@
+from bs4 import BeautifulSoup, SoupStrainer, Tag
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from fake_useragent import UserAgent
+from typing import List, Dict, Optional, Any, Iterable, Iterator, Callable, Tuple, Hashable
+from concurrent.futures import (
+    CancelledError,
+    Future,
+    ProcessPoolExecutor,
+    ThreadPoolExecutor,
+    as_completed,
+)
+from pathlib import Path
+from urllib.parse import urlsplit
+from httpcache import ResponseCache
+from release import Artist, Release
+import profiling
+import collections
+import hashlib
+import heapq
+import html
+import itertools
+import re
+import threading
+import time
+
+
+try:
+    import lxml
+
+    PARSER = "lxml"
+except ImportError:
+    PARSER = "html.parser"
+
+ALL_TYPES = ["album", "ep", "mixtape"]
+SECTION_IDS = {"album": "s", "ep": "e", "mixtape": "m"}
+DISCOGRAPHY_STRAINER = SoupStrainer(id="discography")
+_DISCOGRAPHY_START_RE = re.compile(rb'<(\w+)\b[^>]*?\bid="discography"')
+_ARTIST_NAME_RE = re.compile(
+    rb'class="[^"]*\bartist_page\b[^"]*"[^>]*>.*?<meta\b[^>]*?\bcontent="([^"]*)"',
+    re.DOTALL,
+)
+_CANONICAL_LINK_RE = re.compile(
+    rb'<link\b[^>]*?\brel="canonical"[^>]*?\bhref="([^"]*/artist/[^"]*)"'
+)
+
+# Next to the other modules rather than inside this package
+CACHE_DIR = Path(__file__).resolve().parent.parent.joinpath("cache")
+CACHE_TTL = 24 * 60 * 60
+CACHE_MAX_SIZE = 200 * 1024 * 1024
+
+CACHE = ResponseCache(CACHE_DIR, CACHE_TTL, CACHE_MAX_SIZE)
+
+POOL_SIZE = 16
+MAX_RETRIES = 3
+BACKOFF_FACTOR = 0.5
+USER_AGENT_POOL_SIZE = 20
+MAX_WORKERS = 8
+DISCOGRAPHY_CACHE_SIZE = 64
+INGEST_CHUNK_SIZE = 4
+
+# Request pacing per host; rates are in requests per second
+INITIAL_RATE = 2.0
+MIN_RATE = 0.2
+MAX_RATE = 20.0
+RATE_BURST = 4
+SLOW_START_FACTOR = 1.05
+RATE_INCREASE = 0.5
+INITIAL_CONCURRENCY = 2
+MAX_CONCURRENCY = POOL_SIZE
+THROTTLE_STATUSES = [429, 503]
+
+# Request priorities, lowest first
+INTERACTIVE = 0
+BACKGROUND = 1
+
+# Parsed discographies by artist link, with when they were remembered
+_DISCOGRAPHIES: "collections.OrderedDict[str, Tuple[float, Discography]]" = (
+    collections.OrderedDict()
+)
+_DISCOGRAPHIES_LOCK = threading.Lock()
+
+_BROWSER_POOL = None
+_BROWSER_POOL_LOCK = threading.Lock()
+
+
+class TokenBucket:
+    """Hands out RATE tokens a second, saving up at most BURST of them."""
+
+    def __init__(self, rate: float, burst: int, clock=time.monotonic):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self._clock = clock
+        self._updated = clock()
+
+    def take(self) -> float:
+        """Take a token and return 0, or return how long until one is ready."""
+
+        now = self._clock()
+        self.tokens = min(
+            self.burst, self.tokens + max(now - self._updated, 0) * self.rate
+        )
+        self._updated = max(now, self._updated)
+
+        if now >= self._updated and self.tokens >= 1:
+            self.tokens -= 1
+            return 0.0
+
+        return max(self._updated - now, 0) + (1 - self.tokens) / self.rate
+
+    def pause(self, seconds: float) -> None:
+        """Hand out nothing for SECONDS, then start again from empty."""
+
+        self.tokens = 0.0
+        self._updated = max(self._updated, self._clock() + seconds)
+
+
+class _Host:
+    def __init__(self, bucket: TokenBucket, concurrency: float):
+        self.bucket = bucket
+        self.concurrency = concurrency
+        self.in_flight = 0
+        self.waiting: List[Tuple[int, int]] = []
+        self.slowed_down = float("-inf")
+        self.slow_start = True
+
+
+def _retry_after(response: requests.Response) -> Optional[float]:
+    try:
+        return float(response.headers.get("Retry-After"))
+    except (TypeError, ValueError):
+        return None
+
+
+class Scheduler:
+    """Paces the requests sent to each host.
+
+    Requests wait their turn in a priority queue per host, so interactive
+    ones go ahead of background jobs, and are only sent while a token bucket
+    has tokens and fewer than the host's concurrency limit are in flight.
+    The rate and the limit both grow with every successful request, the
+    rate by SLOW_START_FACTOR until the host first pushes back and by about
+    RATE_INCREASE a second after that. Both are halved when the host answers
+    429 or 503 (at most once per round of requests), after which the
+    request is queued again.
+    """
+
+    def __init__(
+        self,
+        rate=INITIAL_RATE,
+        min_rate=MIN_RATE,
+        max_rate=MAX_RATE,
+        burst=RATE_BURST,
+        concurrency=INITIAL_CONCURRENCY,
+        max_concurrency=MAX_CONCURRENCY,
+        max_retries=MAX_RETRIES,
+        clock=time.monotonic,
+    ):
+        self.rate = rate
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.burst = burst
+        self.concurrency = concurrency
+        self.max_concurrency = max_concurrency
+        self.max_retries = max_retries
+        self._clock = clock
+        self._hosts: Dict[str, _Host] = {}
+        self._tickets = itertools.count()
+        self._condition = threading.Condition()
+
+    def host(self, host: str) -> _Host:
+        with self._condition:
+            if host not in self._hosts:
+                self._hosts[host] = _Host(
+                    TokenBucket(self.rate, self.burst, self._clock), self.concurrency
+                )
+
+            return self._hosts[host]
+
+    def _acquire(self, host: _Host, priority: int) -> Tuple[float, bool, bool]:
+        """Wait for this request's turn.
+
+        Returns when it started and whether it was held back by the rate and
+        by the concurrency limit, since only limits that are actually reached
+        should grow.
+        """
+
+        ticket = (priority, next(self._tickets))
+        rate_limited = False
+        concurrency_limited = False
+
+        with self._condition:
+            heapq.heappush(host.waiting, ticket)
+
+            while True:
+                timeout = None
+                if host.waiting[0] == ticket:
+                    if host.in_flight < int(host.concurrency):
+                        timeout = host.bucket.take()
+                        if timeout == 0:
+                            heapq.heappop(host.waiting)
+                            host.in_flight += 1
+                            concurrency_limited = concurrency_limited or (
+                                host.in_flight >= int(host.concurrency)
+                            )
+                            # Let the next request in line wait for a token
+                            self._condition.notify_all()
+                            return self._clock(), rate_limited, concurrency_limited
+
+                        rate_limited = True
+                    else:
+                        concurrency_limited = True
+
+                self._condition.wait(timeout)
+
+    def _release(
+        self,
+        host: _Host,
+        acquired: Tuple[float, bool, bool],
+        response: Optional[requests.Response],
+    ) -> None:
+        started, rate_limited, concurrency_limited = acquired
+
+        with self._condition:
+            host.in_flight -= 1
+
+            if response is not None and response.status_code in THROTTLE_STATUSES:
+                profiling.count("throttled")
+
+                # Requests sent before the last slowdown were answered at the
+                # old pace, so only the first of them slows things down again
+                if started > host.slowed_down:
+                    host.slowed_down = self._clock()
+                    host.slow_start = False
+                    host.concurrency = max(1.0, host.concurrency / 2)
+                    host.bucket.rate = max(self.min_rate, host.bucket.rate / 2)
+
+                host.bucket.pause(_retry_after(response) or 1 / host.bucket.rate)
+            elif response is not None:
+                if concurrency_limited:
+                    host.concurrency = min(
+                        self.max_concurrency, host.concurrency + 1 / host.concurrency
+                    )
+                if rate_limited and host.slow_start:
+                    host.bucket.rate = min(
+                        self.max_rate, host.bucket.rate * SLOW_START_FACTOR
+                    )
+                elif rate_limited:
+                    host.bucket.rate = min(
+                        self.max_rate,
+                        host.bucket.rate + RATE_INCREASE / host.bucket.rate,
+                    )
+
+            self._condition.notify_all()
+
+    def send(
+        self,
+        url: str,
+        request: Callable[[], requests.Response],
+        priority=INTERACTIVE,
+    ) -> requests.Response:
+        """Call REQUEST for URL once it's this request's turn, retrying if throttled."""
+
+        host = self.host(urlsplit(url).netloc)
+
+        for _ in range(self.max_retries + 1):
+            acquired = self._acquire(host, priority)
+
+            response = None
+            try:
+                response = request()
+            finally:
+                self._release(host, acquired, response)
+
+            if response.status_code not in THROTTLE_STATUSES:
+                break
+
+        return response
+
+
+class Fetcher:
+    """Shares one pooled keep-alive session and user agent pool across fetches."""
+
+    def __init__(
+        self,
+        pool_size=POOL_SIZE,
+        max_retries=MAX_RETRIES,
+        scheduler: Optional[Scheduler] = None,
+    ):
+        self.pool_size = pool_size
+        self.max_retries = max_retries
+        self.scheduler = scheduler if scheduler else Scheduler()
+        self._session = None
+        self._user_agents = None
+        self._lock = threading.Lock()
+
+    def _build_session(self) -> requests.Session:
+        retry = Retry(
+            total=self.max_retries,
+            backoff_factor=BACKOFF_FACTOR,
+            # 429 and 503 (and their Retry-After) are left to the scheduler,
+            # which slows down for them
+            status_forcelist=[500, 502, 504],
+            allowed_methods=["GET"],
+            respect_retry_after_header=False,
+            raise_on_status=False,
+        )
+        adapter = HTTPAdapter(
+            pool_connections=self.pool_size,
+            pool_maxsize=self.pool_size,
+            max_retries=retry,
+        )
+
+        session = requests.Session()
+        session.mount("https://", adapter)
+        session.mount("http://", adapter)
+
+        return session
+
+    @property
+    def session(self) -> requests.Session:
+        if self._session is None:
+            with self._lock:
+                if self._session is None:
+                    self._session = self._build_session()
+
+        return self._session
+
+    def user_agent(self) -> str:
+        """Rotate through user agents picked once per process."""
+
+        if self._user_agents is None:
+            with self._lock:
+                if self._user_agents is None:
+                    with profiling.span("user agents"):
+                        user_agent = UserAgent()
+                        self._user_agents = itertools.cycle(
+                            [user_agent.random for _ in range(USER_AGENT_POOL_SIZE)]
+                        )
+
+        return next(self._user_agents)
+
+    def get(
+        self, url: str, headers: Optional[Dict] = None, priority=INTERACTIVE
+    ) -> requests.Response:
+        request_headers = {"User-Agent": self.user_agent()}
+        if headers:
+            request_headers.update(headers)
+
+        return self.scheduler.send(
+            url, lambda: self.session.get(url, headers=request_headers), priority
+        )
+
+    def close(self) -> None:
+        if self._session is not None:
+            self._session.close()
+            self._session = None
+
+
+FETCHER = Fetcher()
+
+
+class SingleFlight:
+    """Lets concurrent callers asking for the same key share one call.
+
+    The first caller (the leader) runs the call; everyone who asks for the
+    key while it's running waits for the leader's result or exception
+    instead of running it again. Nothing is kept once the call finishes.
+    """
+
+    def __init__(self):
+        self._calls: Dict[Hashable, Future] = {}
+        self._lock = threading.Lock()
+
+    def join(self, key: Hashable) -> Tuple[Future, bool]:
+        """Get the future for KEY's call and whether the caller must run it."""
+
+        with self._lock:
+            future = self._calls.get(key)
+            if future is not None:
+                profiling.count("shared fetches")
+                return future, False
+
+            future = Future()
+            self._calls[key] = future
+            return future, True
+
+    def finish(
+        self,
+        key: Hashable,
+        future: Future,
+        result: Any = None,
+        exception: Optional[BaseException] = None,
+    ) -> None:
+        """Hand the leader's result or exception to everyone waiting on KEY."""
+
+        with self._lock:
+            if self._calls.get(key) is future:
+                del self._calls[key]
+
+        if exception is None:
+            future.set_result(result)
+        elif isinstance(exception, Exception):
+            future.set_exception(exception)
+        else:
+            # The leader was interrupted, so whoever is waiting tries again
+            future.cancel()
+
+    def do(self, key: Hashable, function: Callable, *args) -> Any:
+        """Call FUNCTION with ARGS, or wait for the call already running for KEY."""
+
+        while True:
+            future, leader = self.join(key)
+            if leader:
+                break
+
+            try:
+                return future.result()
+            except CancelledError:
+                if not future.cancelled():
+                    raise
+
+        try:
+            result = function(*args)
+        except BaseException as e:
+            self.finish(key, future, exception=e)
+            raise
+
+        self.finish(key, future, result)
+
+        return result
+
+
+# Discographies being fetched right now, by artist link
+_IN_FLIGHT = SingleFlight()
+
+
+def _fetch(url: str, revalidate=False, priority=INTERACTIVE) -> Optional[bytes]:
+    """Get the body of URL, going through the response cache.
+
+    With REVALIDATE, even a fresh cached body is checked with the server.
+    PRIORITY is where the request goes in the scheduler's queue.
+    """
+
+    with profiling.span("cache"):
+        cached = CACHE.get(url)
+    if cached and cached.fresh and not revalidate:
+        profiling.count("cache hits")
+        return cached.content
+
+    headers = CACHE.validators(cached) if cached else None
+    # Includes DNS and connecting, which requests doesn't time separately
+    with profiling.span("http"):
+        response = FETCHER.get(url, headers, priority)
+    profiling.count("requests")
+    profiling.count("bytes downloaded", len(response.content))
+
+    if response.status_code == 304 and cached:
+        CACHE.refresh(url)
+        return cached.content
+
+    if not response.status_code == 200:
+        return None
+
+    with profiling.span("cache"):
+        CACHE.put(
+            url,
+            response.content,
+            response.headers.get("ETag"),
+            response.headers.get("Last-Modified"),
+        )
+
+    return response.content
+
+
+def _get_artist_release_info(
+    release: Tag,
+    release_type: str,
+    artist_name: str,
+    artist_link: str,
+) -> Optional[Dict]:
+    title_and_link = release.find(class_="disco_info").find("a")
+    title = title_and_link["title"]
+    link = title_and_link["href"]
+
+    ratings_check = release.find(class_="disco_ratings").contents
+    # If the release has any ratings
+    if len(ratings_check) > 0:
+        ratings = int(ratings_check[0].replace(",", ""))
+    else:
+        return
+
+    average_check = release.find(class_="disco_avg_rating").contents
+    # If the release has an average score
+    if len(average_check) > 0:
+        average = float(average_check[0])
+    else:
+        return
+
+    year_check = release.find(class_="disco_subline").find("span").contents
+    # If the release has a listed year
+    if len(year_check) > 0:
+        year = int(year_check[0])
+    else:
+        year = "N/A"
+
+    return Release(
+        artist_name, title, link, artist_link, ratings, average, year, release_type
+    )
+
+
+def _check_release_types(release_types: List[str]) -> None:
+    for release_type in release_types:
+        if release_type not in SECTION_IDS:
+            raise ValueError("Not a valid release type")
+
+
+def _parse_artist_name(content: bytes) -> Optional[str]:
+    match = _ARTIST_NAME_RE.search(content)
+    if not match:
+        return None
+
+    return html.unescape(match.group(1).decode("utf-8", "replace"))
+
+
+def _parse_showing_total(text: str) -> Optional[int]:
+    """The Y in a section's "Showing X of Y" header."""
+
+    text = text.strip()
+    try:
+        return int(text[text.rfind(" ") + 1 :].replace(",", ""))
+    except ValueError:
+        return None
+
+
+def _is_section_or_release(tag: Tag) -> bool:
+    if tag.get("id", "").startswith("disco_type_"):
+        return True
+
+    classes = tag.get("class", ())
+    return "disco_release" in classes or "disco_showing" in classes
+
+
+class Discography:
+    """Every release parsed from one artist page, indexed by title and link.
+
+    SHOWN is how many release rows each section had on the page and TOTALS
+    how many its header says it has, so cut-off sections can be told apart.
+    """
+
+    def __init__(
+        self,
+        artist_name: str,
+        artist_link: str,
+        releases: Dict[str, List[Release]],
+        shown: Optional[Dict[str, int]] = None,
+        totals: Optional[Dict[str, Optional[int]]] = None,
+    ):
+        self.artist = artist_name
+        self.artist_link = artist_link
+        self.releases_by_type = releases
+        self.shown = shown or {}
+        self.totals = totals or {}
+        self._titles: Dict[str, Release] = {}
+        self._links: Dict[str, Release] = {}
+
+        for type_releases in releases.values():
+            for release in type_releases:
+                self._titles.setdefault(release.title.lower(), release)
+                self._links.setdefault(release.link, release)
+
+    def __len__(self) -> int:
+        return len(self._links)
+
+    def releases(self, release_types=ALL_TYPES) -> List[Release]:
+        """All releases of a certain type or types, grouped in that order."""
+
+        _check_release_types(release_types)
+
+        releases_list = []
+        for release_type in release_types:
+            releases_list += self.releases_by_type[release_type]
+
+        return releases_list
+
+    def truncated_types(self, release_types=ALL_TYPES) -> List[str]:
+        """The release types whose sections were cut off on the static page."""
+
+        _check_release_types(release_types)
+
+        truncated = []
+        for release_type in release_types:
+            total = self.totals.get(release_type)
+            if total is not None and self.shown.get(release_type, 0) < total:
+                truncated.append(release_type)
+
+        return truncated
+
+    def find_title(self, title: str) -> Optional[Release]:
+        """Case-insensitive lookup of a release by its title."""
+
+        return self._titles.get(title.lower())
+
+    def find_link(self, link: str) -> Optional[Release]:
+        return self._links.get(link)
+
+
+def _parse_full_artist_page(content: bytes, artist_link: str) -> Discography:
+    soup = BeautifulSoup(content, "html.parser")
+
+    artist_name = soup.select_one(".artist_page meta")["content"]
+
+    releases_by_type = {}
+    shown = {}
+    totals = {}
+    for release_type, id_ in SECTION_IDS.items():
+        releases = soup.select(f"#disco_type_{id_} .disco_release")
+        showing = soup.select_one(f"#disco_type_{id_} .disco_showing span")
+
+        shown[release_type] = len(releases)
+        if showing:
+            totals[release_type] = _parse_showing_total(showing.get_text())
+
+        releases_by_type[release_type] = []
+        for release in releases:
+            release_entry = _get_artist_release_info(
+                release, release_type, artist_name, artist_link
+            )
+            if release_entry:
+                releases_by_type[release_type].append(release_entry)
+
+    return Discography(artist_name, artist_link, releases_by_type, shown, totals)
+
+
+@profiling.timed("parse")
+def parse_discography(content: bytes, artist_link: str) -> Discography:
+    """Extract every album, EP and mixtape from an artist page.
+
+    Only the #discography part of the page is turned into a tree, with lxml
+    if it is installed, and all of its sections are read in one pass.
+    """
+
+    if isinstance(content, str):
+        content = content.encode("utf-8")
+
+    artist_name = _parse_artist_name(content)
+    # Fall back to parsing the whole page if the name can't be found cheaply
+    if artist_name is None:
+        return _parse_full_artist_page(content, artist_link)
+
+    discography = BeautifulSoup(content, PARSER, parse_only=DISCOGRAPHY_STRAINER)
+
+    section_types = {
+        f"disco_type_{id_}": release_type for release_type, id_ in SECTION_IDS.items()
+    }
+    releases_by_type = {release_type: [] for release_type in SECTION_IDS}
+    shown = {release_type: 0 for release_type in SECTION_IDS}
+    totals = {}
+    release_type = None
+
+    for tag in discography.find_all(_is_section_or_release):
+        section_id = tag.get("id", "")
+        if section_id.startswith("disco_type_"):
+            release_type = section_types.get(section_id)
+            continue
+
+        if release_type is None:
+            continue
+
+        if "disco_showing" in tag.get("class", ()):
+            showing = tag.find("span")
+            if showing and release_type not in totals:
+                totals[release_type] = _parse_showing_total(showing.get_text())
+            continue
+
+        shown[release_type] += 1
+
+        release_entry = _get_artist_release_info(
+            tag, release_type, artist_name, artist_link
+        )
+        if release_entry:
+            releases_by_type[release_type].append(release_entry)
+
+    return Discography(artist_name, artist_link, releases_by_type, shown, totals)
+
+
+def parse_artist_page(
+    content: bytes, artist_link: str, release_types=["album"]
+) -> List[Release]:
+    """Extract the releases of a certain type or types from an artist page."""
+
+    _check_release_types(release_types)
+
+    return parse_discography(content, artist_link).releases(release_types)
+
+
+def get_discography(artist: str, priority=INTERACTIVE) -> Optional[Discography]:
+    """Get the parsed discography of an artist, reusing earlier parses.
+
+    Callers asking for the same artist at the same time share one request
+    and one parse.
+    """
+
+    artist_link = f"https://rateyourmusic.com/artist/{rymify(artist)}"
+
+    discography = _remembered_discography(artist_link)
+    if discography is not None:
+        return discography
+
+    return _IN_FLIGHT.do(artist_link, _load_discography, artist_link, priority)
+
+
+def _load_discography(artist_link: str, priority=INTERACTIVE) -> Optional[Discography]:
+    # Another caller may have loaded it since we last looked
+    discography = _remembered_discography(artist_link)
+    if discography is not None:
+        return discography
+
+    content = _fetch(artist_link, priority=priority)
+
+    # Immediately terminate if artist doesn't exist
+    if content is None:
+        return None
+
+    discography = parse_discography(content, artist_link)
+    profiling.count("releases parsed", len(discography))
+    _remember_discography(discography)
+
+    return discography
+
+
+def _discography_element(content: bytes) -> bytes:
+    """The bytes of an artist page's #discography element, tags and all.
+
+    Its end is found by balancing the element's opening and closing tags,
+    without parsing the page. Empty if the page has no #discography.
+    """
+
+    start = _DISCOGRAPHY_START_RE.search(content)
+    if start is None:
+        return b""
+
+    tags = re.compile(rb"<(/?)" + re.escape(start.group(1)) + rb"\b[^>]*>", re.I)
+    depth = 0
+    for tag in tags.finditer(content, start.start()):
+        depth += -1 if tag.group(1) else 1
+        if depth == 0:
+            return content[start.start() : tag.end()]
+
+    # Never closed, so the page was cut off
+    return content[start.start() :]
+
+
+def _page_hash(content: bytes) -> str:
+    """A hash of the artist's name and the #discography part of their page.
+
+    Everything else (scripts, tokens, ads, comments, lists) is left out,
+    since it can change on every request.
+    """
+
+    artist_name = _parse_artist_name(content) or ""
+
+    return hashlib.sha256(
+        artist_name.encode("utf-8") + _discography_element(content)
+    ).hexdigest()
+
+
+def refresh_discography(
+    artist_link: str, previous_hash: Optional[str] = None
+) -> Tuple[Optional[str], Optional[Discography]]:
+    """Fetch an artist page again, parsing it only if it changed.
+
+    Returns the page's hash and its discography, or just the hash if it's
+    the same as PREVIOUS_HASH, or (None, None) if the page wasn't found.
+    """
+
+    content = _fetch(artist_link, revalidate=True, priority=BACKGROUND)
+
+    if content is None:
+        return None, None
+
+    content_hash = _page_hash(content)
+    if content_hash == previous_hash:
+        return content_hash, None
+
+    discography = parse_discography(content, artist_link)
+    profiling.count("releases parsed", len(discography))
+    _remember_discography(discography)
+
+    return content_hash, discography
+
+
+def refresh_discographies(
+    previous_hashes: Dict[str, Optional[str]],
+    max_workers=MAX_WORKERS,
+    progress: Optional[Callable[[str], Any]] = None,
+) -> Tuple[Dict[str, Tuple[Optional[str], Optional[Discography]]], Dict[str, Exception]]:
+    """Refresh many artist pages at once through a bounded thread pool.
+
+    PREVIOUS_HASHES maps each artist link to the hash it had last time.
+    Returns a dict of artist link -> refresh_discography() result and a dict
+    of artist link -> exception for every page that failed.
+    """
+
+    results = {}
+    failures = {}
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = {
+            executor.submit(refresh_discography, artist_link, previous_hash): artist_link
+            for artist_link, previous_hash in previous_hashes.items()
+        }
+
+        for future in as_completed(futures):
+            artist_link = futures[future]
+            try:
+                results[artist_link] = future.result()
+            except Exception as e:
+                failures[artist_link] = e
+
+            if progress:
+                progress(artist_link)
+
+    return results, failures
+
+
+def _remembered_discography(artist_link: str) -> Optional[Discography]:
+    """An earlier parse of an artist's page, unless it's older than CACHE_TTL."""
+
+    with _DISCOGRAPHIES_LOCK:
+        if artist_link not in _DISCOGRAPHIES:
+            return None
+
+        remembered, discography = _DISCOGRAPHIES[artist_link]
+        if time.time() - remembered >= CACHE_TTL:
+            # Go back to the response cache, which revalidates stale pages
+            del _DISCOGRAPHIES[artist_link]
+            return None
+
+        _DISCOGRAPHIES.move_to_end(artist_link)
+        return discography
+
+
+def _remember_discography(discography: Discography) -> None:
+    with _DISCOGRAPHIES_LOCK:
+        _DISCOGRAPHIES[discography.artist_link] = (time.time(), discography)
+        _DISCOGRAPHIES.move_to_end(discography.artist_link)
+        if len(_DISCOGRAPHIES) > DISCOGRAPHY_CACHE_SIZE:
+            _DISCOGRAPHIES.popitem(last=False)
+
+
+def _browser_pool():
+    """The shared browser pool, started the first time a page needs it."""
+
+    global _BROWSER_POOL
+
+    with _BROWSER_POOL_LOCK:
+        if _BROWSER_POOL is None:
+            # Only pull in Selenium when a discography actually needs it
+            import rymapi3
+
+            _BROWSER_POOL = rymapi3.DriverPool()
+
+        return _BROWSER_POOL
+
+
+def close_browsers() -> None:
+    """Quit any browsers started by get_complete_discography."""
+
+    global _BROWSER_POOL
+
+    with _BROWSER_POOL_LOCK:
+        if _BROWSER_POOL is not None:
+            _BROWSER_POOL.close()
+            _BROWSER_POOL = None
+
+
+def get_complete_discography(
+    artist: str, release_types=ALL_TYPES, priority=INTERACTIVE
+) -> Optional[Discography]:
+    """Get an artist's discography, expanding cut-off sections in a browser.
+
+    The static page is used as is unless one of RELEASE_TYPES has fewer rows
+    than its header promises, in which case only those sections are loaded
+    again through the pooled browser.
+    """
+
+    discography = get_discography(artist, priority)
+
+    if discography is None:
+        return None
+
+    truncated = discography.truncated_types(release_types)
+    if not truncated:
+        return discography
+
+    # Opening the same artist in two browsers at once would be wasted work
+    return _IN_FLIGHT.do(
+        (discography.artist_link, tuple(truncated)),
+        _expand_discography,
+        artist,
+        discography,
+        truncated,
+    )
+
+
+def _expand_discography(
+    artist: str, discography: Discography, truncated: List[str]
+) -> Discography:
+    import rymapi3
+
+    with profiling.span("browser"):
+        api = rymapi3.RymApi(_browser_pool())
+        try:
+            expanded = api.get_discography(artist, truncated)
+        finally:
+            api.quit()
+
+    releases_by_type = dict(discography.releases_by_type)
+    shown = dict(discography.shown)
+    totals = dict(discography.totals)
+    for release_type in truncated:
+        releases_by_type[release_type] = expanded.releases_by_type[release_type]
+        shown[release_type] = expanded.shown[release_type]
+        totals[release_type] = expanded.totals.get(release_type)
+
+    complete = Discography(
+        discography.artist, discography.artist_link, releases_by_type, shown, totals
+    )
+    _remember_discography(complete)
+
+    return complete
+
+
+def get_artist_releases(
+    artist: str, release_types=["album"], complete=False, priority=INTERACTIVE
+) -> List[Release]:
+    """Get all releases of a certain type or types"""
+
+    _check_release_types(release_types)
+
+    if complete:
+        discography = get_complete_discography(artist, release_types, priority)
+    else:
+        discography = get_discography(artist, priority)
+
+    if discography is None:
+        return None
+
+    return discography.releases(release_types)
+
+
+def get_many_artist_releases(
+    artists: Iterable[str],
+    release_types=["album"],
+    max_workers=MAX_WORKERS,
+    progress: Optional[Callable[[str], Any]] = None,
+    complete=False,
+) -> Tuple[Dict[str, Optional[List[Release]]], Dict[str, Exception]]:
+    """Get releases for many artists at once through a bounded thread pool.
+
+    Returns a dict of artist -> releases (None if the artist wasn't found) in
+    the order the artists were given, and a dict of artist -> exception for
+    every artist whose fetch failed. PROGRESS is called with each artist as
+    it finishes. With COMPLETE, cut-off sections are expanded in a browser.
+    The requests are sent with BACKGROUND priority.
+    """
+
+    artists = list(dict.fromkeys(artists))
+    fetched = {}
+    failures = {}
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = {
+            executor.submit(
+                get_artist_releases, artist, release_types, complete, BACKGROUND
+            ): artist
+            for artist in artists
+        }
+
+        for future in as_completed(futures):
+            artist = futures[future]
+            try:
+                fetched[artist] = future.result()
+            except Exception as e:
+                failures[artist] = e
+
+            if progress:
+                progress(artist)
+
+    results = {artist: fetched[artist] for artist in artists if artist in fetched}
+
+    return results, failures
+
+
+def _saved_page_artist_link(content: bytes, path: Path) -> str:
+    """The artist link of a saved page, from its canonical link or file name."""
+
+    match = _CANONICAL_LINK_RE.search(content)
+    if match:
+        return html.unescape(match.group(1).decode("utf-8", "replace")).rstrip("/")
+
+    return f"https://rateyourmusic.com/artist/{Path(path).stem}"
+
+
+def parse_saved_page(path: Path, release_types=["album"]) -> List[Release]:
+    """Extract the releases of a certain type or types from a saved artist page."""
+
+    content = Path(path).read_bytes()
+
+    return parse_artist_page(
+        content, _saved_page_artist_link(content, path), release_types
+    )
+
+
+def _ingest_page(
+    path: Path, release_types: List[str]
+) -> Tuple[Path, Optional[List[Release]], Optional[str]]:
+    # Exceptions are returned as text, since not all of them can be pickled
+    try:
+        return path, parse_saved_page(path, release_types), None
+    except Exception as e:
+        return path, None, f"{type(e).__name__}: {e}"
+
+
+def ingest_pages(
+    paths: Iterable[Path],
+    release_types=["album"],
+    max_workers: Optional[int] = None,
+) -> Iterator[Tuple[Path, Optional[List[Release]], Optional[str]]]:
+    """Parse many saved artist pages at once across a pool of processes.
+
+    Yields (path, releases, error) for each page in the order given, as soon
+    as it's parsed; RELEASES is None and ERROR says why if a page couldn't
+    be parsed. MAX_WORKERS defaults to the number of CPUs.
+    """
+
+    _check_release_types(release_types)
+
+    paths = list(paths)
+
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        yield from executor.map(
+            _ingest_page,
+            paths,
+            itertools.repeat(release_types, len(paths)),
+            chunksize=INGEST_CHUNK_SIZE,
+        )
+
+
+def get_one_release(artist: str, release_title: str) -> Optional[Release]:
+    """Get the release that matches the title"""
+
+    discography = get_discography(artist)
+
+    if discography is None:
+        return None
+
+    return discography.find_title(release_title)
+
+
+def rymify(artist_name: str) -> str:
+    """Converts an artist or release name to how it would appear in an RYM link."""
+
+    # Convert to lowercase, convert ampersand to "and", and replace spaces with dashes
+    return artist_name.lower().replace(" & ", "-and-").replace(" ", "-").strip(",")
+
+
+# Debug
+if __name__ == "__main__":
+    print(get_artist_releases("Classic J", ["album", "ep"]))
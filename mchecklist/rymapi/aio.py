@@ -0,0 +1,307 @@
+"""Async versions of the rymapi fetchers, for use from an event loop.
+
+Requests share one aiohttp connection pool and go through the same response
+cache and request scheduler as the blocking API. Parsing runs in an
+executor, so the event loop is never blocked, and the results are the same
+Release tuples the blocking API returns.
+
+Needs aiohttp, which is optional.
+"""
+
+from concurrent.futures import Executor, ThreadPoolExecutor
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+from urllib.parse import urlsplit
+import asyncio
+import collections
+
+from release import Release
+import profiling
+import rymapi
+
+try:
+    import aiohttp
+except ImportError:
+    aiohttp = None
+
+
+AsyncResponse = collections.namedtuple(
+    "AsyncResponse", ["status_code", "headers", "content"]
+)
+
+
+class AsyncFetcher:
+    """Shares one aiohttp session per event loop across fetches.
+
+    Waiting for the scheduler (which blocks) happens on a small thread pool
+    of its own, never on the event loop.
+    """
+
+    def __init__(
+        self,
+        pool_size=rymapi.POOL_SIZE,
+        scheduler: Optional[rymapi.Scheduler] = None,
+    ):
+        self.pool_size = pool_size
+        self._scheduler = scheduler
+        self._session = None
+        self._loop = None
+        self._waiters = None
+
+    @property
+    def scheduler(self) -> rymapi.Scheduler:
+        # Pace requests together with the blocking API unless told otherwise
+        return self._scheduler if self._scheduler else rymapi.FETCHER.scheduler
+
+    def _get_session(self) -> "aiohttp.ClientSession":
+        if aiohttp is None:
+            raise ImportError("rymapi.aio needs aiohttp; install it with pip")
+
+        loop = asyncio.get_running_loop()
+        # A session only works on the loop it was made on
+        if self._session is None or self._session.closed or self._loop is not loop:
+            self._session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=self.pool_size)
+            )
+            self._loop = loop
+
+        return self._session
+
+    async def _acquire(self, host, priority: int):
+        if self._waiters is None:
+            self._waiters = ThreadPoolExecutor(
+                max_workers=rymapi.MAX_CONCURRENCY * 2,
+                thread_name_prefix="rymapi-aio-scheduler",
+            )
+
+        scheduler = self.scheduler
+        waiting = self._waiters.submit(scheduler._acquire, host, priority)
+
+        try:
+            return await asyncio.wrap_future(waiting)
+        except asyncio.CancelledError:
+            # The slot may still be granted after we've stopped waiting
+            waiting.add_done_callback(
+                lambda future: future.cancelled()
+                or scheduler._release(host, future.result(), None)
+            )
+            raise
+
+    async def get(
+        self, url: str, headers: Optional[Dict] = None, priority=rymapi.INTERACTIVE
+    ) -> AsyncResponse:
+        session = self._get_session()
+        scheduler = self.scheduler
+        host = scheduler.host(urlsplit(url).netloc)
+
+        # The first call builds the user agent pool, which can be slow
+        user_agent = await asyncio.get_running_loop().run_in_executor(
+            None, rymapi.FETCHER.user_agent
+        )
+        request_headers = {"User-Agent": user_agent}
+        if headers:
+            request_headers.update(headers)
+
+        for _ in range(scheduler.max_retries + 1):
+            acquired = await self._acquire(host, priority)
+
+            response = None
+            try:
+                async with session.get(url, headers=request_headers) as raw_response:
+                    response = AsyncResponse(
+                        raw_response.status,
+                        raw_response.headers,
+                        await raw_response.read(),
+                    )
+            finally:
+                scheduler._release(host, acquired, response)
+
+            if response.status_code not in rymapi.THROTTLE_STATUSES:
+                break
+
+        return response
+
+    async def close(self) -> None:
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
+
+        if self._waiters is not None:
+            self._waiters.shutdown(wait=False)
+            self._waiters = None
+
+
+FETCHER = AsyncFetcher()
+
+
+async def _fetch(
+    url: str, revalidate=False, priority=rymapi.INTERACTIVE
+) -> Optional[bytes]:
+    """Get the body of URL, going through the shared response cache."""
+
+    loop = asyncio.get_running_loop()
+    cache = rymapi.CACHE
+
+    cached = await loop.run_in_executor(None, cache.get, url)
+    if cached and cached.fresh and not revalidate:
+        profiling.count("cache hits")
+        return cached.content
+
+    headers = cache.validators(cached) if cached else None
+    with profiling.span("http"):
+        response = await FETCHER.get(url, headers, priority)
+    profiling.count("requests")
+    profiling.count("bytes downloaded", len(response.content))
+
+    if response.status_code == 304 and cached:
+        await loop.run_in_executor(None, cache.refresh, url)
+        return cached.content
+
+    if not response.status_code == 200:
+        return None
+
+    await loop.run_in_executor(
+        None,
+        cache.put,
+        url,
+        response.content,
+        response.headers.get("ETag"),
+        response.headers.get("Last-Modified"),
+    )
+
+    return response.content
+
+
+async def get_discography(
+    artist: str, priority=rymapi.INTERACTIVE, executor: Optional[Executor] = None
+) -> Optional[rymapi.Discography]:
+    """Get the parsed discography of an artist, parsing in EXECUTOR.
+
+    EXECUTOR defaults to the event loop's default executor. Parses, and
+    fetches already in flight, are shared with the blocking API's
+    get_discography.
+    """
+
+    artist_link = f"https://rateyourmusic.com/artist/{rymapi.rymify(artist)}"
+
+    discography = rymapi._remembered_discography(artist_link)
+    if discography is not None:
+        return discography
+
+    while True:
+        future, leader = rymapi._IN_FLIGHT.join(artist_link)
+        if leader:
+            break
+
+        try:
+            # Shielded so a waiter being cancelled doesn't cancel the fetch
+            return await asyncio.shield(asyncio.wrap_future(future))
+        except asyncio.CancelledError:
+            # Only try again if it was the leader that gave up
+            if not future.cancelled():
+                raise
+
+    try:
+        discography = await _load_discography(artist_link, priority, executor)
+    except BaseException as e:
+        rymapi._IN_FLIGHT.finish(artist_link, future, exception=e)
+        raise
+
+    rymapi._IN_FLIGHT.finish(artist_link, future, discography)
+
+    return discography
+
+
+async def _load_discography(
+    artist_link: str, priority=rymapi.INTERACTIVE, executor: Optional[Executor] = None
+) -> Optional[rymapi.Discography]:
+    # Another caller may have loaded it since we last looked
+    discography = rymapi._remembered_discography(artist_link)
+    if discography is not None:
+        return discography
+
+    content = await _fetch(artist_link, priority=priority)
+
+    # Immediately terminate if artist doesn't exist
+    if content is None:
+        return None
+
+    discography = await asyncio.get_running_loop().run_in_executor(
+        executor, rymapi.parse_discography, content, artist_link
+    )
+    profiling.count("releases parsed", len(discography))
+    rymapi._remember_discography(discography)
+
+    return discography
+
+
+async def get_artist_releases(
+    artist: str,
+    release_types=["album"],
+    priority=rymapi.INTERACTIVE,
+    executor: Optional[Executor] = None,
+) -> Optional[List[Release]]:
+    """Get all releases of a certain type or types"""
+
+    rymapi._check_release_types(release_types)
+
+    discography = await get_discography(artist, priority, executor)
+
+    if discography is None:
+        return None
+
+    return discography.releases(release_types)
+
+
+async def get_one_release(
+    artist: str, release_title: str, executor: Optional[Executor] = None
+) -> Optional[Release]:
+    """Get the release that matches the title"""
+
+    discography = await get_discography(artist, executor=executor)
+
+    if discography is None:
+        return None
+
+    return discography.find_title(release_title)
+
+
+async def gather_artists(
+    artists: Iterable[str],
+    release_types=["album"],
+    max_concurrency=rymapi.MAX_WORKERS,
+    progress: Optional[Callable[[str], Any]] = None,
+    executor: Optional[Executor] = None,
+) -> Tuple[Dict[str, Optional[List[Release]]], Dict[str, Exception]]:
+    """Get releases for many artists at once, at most MAX_CONCURRENCY at a time.
+
+    Returns the same (results, failures) pair as get_many_artist_releases.
+    """
+
+    artists = list(dict.fromkeys(artists))
+    semaphore = asyncio.Semaphore(max_concurrency)
+    fetched = {}
+    failures = {}
+
+    async def fetch(artist: str) -> None:
+        async with semaphore:
+            try:
+                fetched[artist] = await get_artist_releases(
+                    artist, release_types, rymapi.BACKGROUND, executor
+                )
+            except Exception as e:
+                failures[artist] = e
+
+        if progress:
+            progress(artist)
+
+    await asyncio.gather(*(fetch(artist) for artist in artists))
+
+    results = {artist: fetched[artist] for artist in artists if artist in fetched}
+
+    return results, failures
+
+
+async def close() -> None:
+    """Close the shared connection pool."""
+
+    await FETCHER.close()
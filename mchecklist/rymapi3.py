@@ -1,37 +1,319 @@
 from selenium import webdriver
+from selenium.common.exceptions import WebDriverException
 from selenium.webdriver.firefox.options import Options
 from selenium.webdriver.common.by import By
+from selenium.webdriver.remote.webelement import WebElement
+from selenium.webdriver.support.ui import WebDriverWait
 import requests
 from bs4 import BeautifulSoup
 from unidecode import unidecode
 from fake_useragent import UserAgent
-from typing import Dict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional
+from release import Release
 import re
+import rymapi
+import threading
+import time
 
 
-class RymApi:
-    def __init__(self):
-        options = Options()
-        user_agent = UserAgent().random
-        options.add_argument(f"--user-agent={user_agent}")
-        options.add_argument("--headless")
-        self.driver = webdriver.Firefox(options=options)
-        self.page_counter = 0
+PAGES_PER_DRIVER = 50
+POOL_SIZE = 2
+EXPAND_TIMEOUT = 30
+
+
+def _start_driver(user_agent: str) -> webdriver.Firefox:
+    options = Options()
+    options.add_argument(f"--user-agent={user_agent}")
+    options.add_argument("--headless")
+    return webdriver.Firefox(options=options)
+
+
+def _showing_total(section: WebElement) -> Optional[int]:
+    """The number of releases a section's "Showing X of Y" header promises."""
+
+    showing = section.find_elements(By.CSS_SELECTOR, ".disco_showing span")
+    if not showing:
+        return None
+
+    return rymapi._parse_showing_total(showing[0].text)
 
-    def reset_driver(self, current_link: str) -> None:
-        self.driver.quit()
 
-        options = Options()
-        user_agent = UserAgent().random
-        options.add_argument(f"--user-agent={user_agent}")
-        options.add_argument("--headless")
-        self.driver = webdriver.Firefox(options=options)
+class PooledDriver:
+    """A browser from a DriverPool, counting the pages it has loaded."""
 
-        self.driver.get(current_link)
+    def __init__(self, driver: webdriver.Firefox):
+        self.driver = driver
         self.page_counter = 0
 
+    def get(self, link: str) -> None:
+        self.driver.get(link)
+        self.page_counter += 1
+
     def quit(self) -> None:
-        self.driver.quit()
+        try:
+            self.driver.quit()
+        except WebDriverException:
+            pass
+
+
+class DriverPool:
+    """Long-lived headless browsers shared between page loads.
+
+    Up to SIZE browsers are started as they're needed, handed out with
+    checkout() and given back with checkin(). A browser that has loaded
+    MAX_PAGES pages is quit when it comes back, and a fresh one with a new
+    user agent takes its place on the next checkout.
+    """
+
+    def __init__(
+        self,
+        size=POOL_SIZE,
+        max_pages=PAGES_PER_DRIVER,
+        start_driver: Callable[[str], webdriver.Firefox] = _start_driver,
+    ):
+        self.size = size
+        self.max_pages = max_pages
+        self._start_driver = start_driver
+        self._user_agents = None
+        self._idle: List[PooledDriver] = []
+        self._started = 0
+        self._closed = False
+        # Notified whenever a browser comes back or a slot for one frees up
+        self._condition = threading.Condition()
+
+    def _user_agent(self) -> str:
+        if self._user_agents is None:
+            self._user_agents = UserAgent()
+
+        return self._user_agents.random
+
+    def checkout(self, timeout: Optional[float] = None) -> PooledDriver:
+        """Take an idle browser, starting one if the pool isn't full yet.
+
+        Waits for a browser to come back or be quit if all SIZE are in use,
+        raising TimeoutError if none has after TIMEOUT seconds.
+        """
+
+        deadline = None if timeout is None else time.monotonic() + timeout
+
+        with self._condition:
+            while True:
+                if self._closed:
+                    raise RuntimeError("Driver pool is closed")
+
+                if self._idle:
+                    return self._idle.pop()
+
+                if self._started < self.size:
+                    self._started += 1
+                    break
+
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    raise TimeoutError("No browser became free in time")
+
+                self._condition.wait(remaining)
+
+        try:
+            return PooledDriver(self._start_driver(self._user_agent()))
+        except Exception:
+            self._free_slot()
+            raise
+
+    def checkin(self, pooled: PooledDriver) -> None:
+        with self._condition:
+            if not self._closed and pooled.page_counter < self.max_pages:
+                self._idle.append(pooled)
+                self._condition.notify()
+                return
+
+        self.discard(pooled)
+
+    def discard(self, pooled: PooledDriver) -> None:
+        """Quit a browser instead of returning it, e.g. after it broke."""
+
+        pooled.quit()
+        self._free_slot()
+
+    def _free_slot(self) -> None:
+        with self._condition:
+            self._started -= 1
+            self._condition.notify()
+
+    @contextmanager
+    def driver(self) -> Iterator[PooledDriver]:
+        pooled = self.checkout()
+        try:
+            yield pooled
+        except WebDriverException:
+            self.discard(pooled)
+            raise
+        except Exception:
+            # The browser is fine, it's what was done with the page that failed
+            self.checkin(pooled)
+            raise
+        except BaseException:
+            # Interrupted mid-page, so there's no telling what state it's in
+            self.discard(pooled)
+            raise
+        else:
+            self.checkin(pooled)
+
+    def map_pages(
+        self, links: Iterable[str], read_page: Callable[[PooledDriver], Any]
+    ) -> List[Any]:
+        """Load each link in a pooled browser and return READ_PAGE's results.
+
+        Pages load concurrently, one per browser in the pool.
+        """
+
+        def load(link: str) -> Any:
+            with self.driver() as pooled:
+                pooled.get(link)
+                return read_page(pooled)
+
+        with ThreadPoolExecutor(max_workers=self.size) as executor:
+            return list(executor.map(load, links))
+
+    def close(self) -> None:
+        with self._condition:
+            self._closed = True
+            idle = self._idle
+            self._idle = []
+            # Anyone still waiting for a browser gives up
+            self._condition.notify_all()
+
+        for pooled in idle:
+            self.discard(pooled)
+
+
+class RymApi:
+    def __init__(self, pool: Optional[DriverPool] = None):
+        self._owns_pool = pool is None
+        self.pool = pool if pool else DriverPool(size=1)
+        self._pooled = self.pool.checkout()
+        self._failed = False
+
+    @property
+    def driver(self) -> webdriver.Firefox:
+        return self._pooled.driver
+
+    @property
+    def page_counter(self) -> int:
+        return self._pooled.page_counter
+
+    def get(self, link: str) -> None:
+        """Load a page, moving to a fresh browser once this one is worn out."""
+
+        if self._pooled.page_counter >= self.pool.max_pages:
+            self.pool.discard(self._pooled)
+            self._pooled = self.pool.checkout()
+
+        try:
+            self._pooled.get(link)
+        except WebDriverException:
+            self._failed = True
+            raise
+
+    def reset_driver(self, current_link: str) -> None:
+        self.pool.discard(self._pooled)
+        self._pooled = self.pool.checkout()
+        self._failed = False
+        self.get(current_link)
+
+    def quit(self) -> None:
+        """Give the browser back to the pool, or quit it if it failed."""
+
+        if self._failed:
+            self.pool.discard(self._pooled)
+        else:
+            self.pool.checkin(self._pooled)
+
+        if self._owns_pool:
+            self.pool.close()
+
+    def _accept_cookies(self) -> None:
+        for cookies_button in self.driver.find_elements(By.CLASS_NAME, "fc-cta-consent"):
+            if cookies_button.is_displayed():
+                cookies_button.click()
+
+    def _section_release_count(self, id_: str) -> int:
+        return len(
+            self.driver.find_elements(
+                By.CSS_SELECTOR, f"#disco_type_{id_} .disco_release"
+            )
+        )
+
+    def expand_discography(
+        self, artist_link: str, release_types=rymapi.ALL_TYPES, timeout=EXPAND_TIMEOUT
+    ) -> str:
+        """Load an artist page with every section of RELEASE_TYPES expanded.
+
+        Rather than sleeping, waits until each section holds as many releases
+        as its header says it has. Raises selenium's TimeoutException if that
+        doesn't happen within TIMEOUT seconds. Returns the page source.
+        """
+
+        rymapi._check_release_types(release_types)
+
+        try:
+            return self._expand_discography(artist_link, release_types, timeout)
+        except WebDriverException:
+            # Including TimeoutException; the page may be stuck half loaded
+            self._failed = True
+            raise
+
+    def _expand_discography(
+        self, artist_link: str, release_types: List[str], timeout: float
+    ) -> str:
+        self.get(artist_link)
+        self._accept_cookies()
+
+        expected = {}
+        for release_type in release_types:
+            id_ = rymapi.SECTION_IDS[release_type]
+            sections = self.driver.find_elements(By.ID, f"disco_type_{id_}")
+            if not sections:
+                continue
+
+            total = _showing_total(sections[0])
+            if total is None or self._section_release_count(id_) >= total:
+                continue
+
+            expected[id_] = total
+            for expand_button in sections[0].find_elements(
+                By.CLASS_NAME, "disco_expand_section_btn"
+            ):
+                self.driver.execute_script("arguments[0].click();", expand_button)
+
+        if expected:
+            WebDriverWait(self.driver, timeout).until(
+                lambda _: all(
+                    self._section_release_count(id_) >= total
+                    for id_, total in expected.items()
+                )
+            )
+
+        return self.driver.page_source
+
+    def get_discography(
+        self, artist: str, release_types=rymapi.ALL_TYPES, timeout=EXPAND_TIMEOUT
+    ) -> rymapi.Discography:
+        """Get an artist's complete discography from the expanded page."""
+
+        artist_link = f"https://rateyourmusic.com/artist/{rymapi.rymify(artist)}"
+        page_source = self.expand_discography(artist_link, release_types, timeout)
+
+        return rymapi.parse_discography(page_source, artist_link)
+
+    def get_artist_releases(
+        self, artist: str, release_types=["album"], timeout=EXPAND_TIMEOUT
+    ) -> List[Release]:
+        return self.get_discography(artist, release_types, timeout).releases(
+            release_types
+        )
 
     def _get_artist(self, artist: str):
         pass
@@ -0,0 +1,333 @@
+import array
+import random
+from typing import Collection, Dict, Iterable, List, Optional
+
+from release import ReleaseRecord, ReleaseTable
+
+
+UNIFORM = "uniform"
+BY_ARTIST = "artist"
+BY_POPULARITY = "popularity"
+MODES = [UNIFORM, BY_ARTIST, BY_POPULARITY]
+
+# Draws to try before falling back to scanning every entry, which only
+# happens when nearly everything is excluded
+MAX_ATTEMPTS = 64
+
+
+class _AliasTable:
+    """Picks from LINKS in proportion to WEIGHTS in O(1) (Vose's alias method)."""
+
+    def __init__(self, links: List[str], weights: List[int]):
+        size = len(links)
+        self.links = links
+        self.total = sum(weights)
+        self.probabilities = array.array("d", [1.0]) * size
+        self.aliases = array.array("I", range(size))
+
+        scaled = [weight * size / self.total for weight in weights]
+        small = [i for i, probability in enumerate(scaled) if probability < 1]
+        large = [i for i, probability in enumerate(scaled) if probability >= 1]
+
+        while small and large:
+            less = small.pop()
+            more = large.pop()
+
+            self.probabilities[less] = scaled[less]
+            self.aliases[less] = more
+
+            scaled[more] += scaled[less] - 1
+            if scaled[more] < 1:
+                small.append(more)
+            else:
+                large.append(more)
+
+    def pick(self, rng: random.Random) -> str:
+        i = rng.randrange(len(self.links))
+        if rng.random() < self.probabilities[i]:
+            return self.links[i]
+
+        return self.links[self.aliases[i]]
+
+
+class _Pool:
+    """Links of some of the to-do entries, in a list that picks are drawn from.
+
+    Removed entries are left in place (and rejected when drawn) until
+    they're most of the list.
+    """
+
+    def __init__(self, links: List[str]):
+        self.links = links
+        self.removed = 0
+        self.table: Optional[_AliasTable] = None
+
+    def add(self, link: str) -> None:
+        self.links.append(link)
+        self.table = None
+
+    def remove(self) -> None:
+        self.removed += 1
+
+    @property
+    def stale(self) -> bool:
+        return self.removed * 2 > len(self.links)
+
+
+class Sampler:
+    """Picks random to-do entries in constant time.
+
+    Works from a checklist's 'to-do' dict of link -> row, its links by
+    artist link and its ReleaseTable, and is told about changes to them
+    through add, remove and update. The lists picks are drawn from (every
+    entry, each type's entries, and the artists) and, for
+    popularity-weighted picks, their alias tables, are built the first time
+    they're needed and only rebuilt once they've gone stale, so most picks
+    never look at the whole to-do list.
+    """
+
+    def __init__(
+        self,
+        todo: Dict[str, int],
+        artists: Dict[str, List[str]],
+        table: ReleaseTable,
+        rng: Optional[random.Random] = None,
+    ):
+        self.rng = rng if rng else random.Random()
+        self._todo = todo
+        self._artists = artists
+        self._table = table
+
+        self._all: Optional[_Pool] = None
+        self._by_type: Optional[Dict[str, _Pool]] = None
+        self._artist_links: Optional[List[str]] = None
+        self._artist_positions: Dict[str, int] = {}
+
+    def __len__(self) -> int:
+        return len(self._todo)
+
+    def _weight(self, link: str) -> int:
+        # Unrated releases can still come up, just rarely
+        return (self._table.ratings_of(self._todo[link]) or 0) + 1
+
+    def add(self, link: str) -> None:
+        """Note that the entry with LINK was added to 'to-do'."""
+
+        row = self._todo[link]
+
+        if self._all is not None:
+            self._all.add(link)
+
+        if self._by_type is not None:
+            self._by_type.setdefault(self._table.type(row), _Pool([])).add(link)
+
+        artist_link = self._table.artist_link(row)
+        if self._artist_links is not None and artist_link not in self._artist_positions:
+            self._artist_positions[artist_link] = len(self._artist_links)
+            self._artist_links.append(artist_link)
+
+    def remove(self, row: int) -> None:
+        """Note that the entry in ROW was taken out of 'to-do'."""
+
+        if self._all is not None:
+            self._all.remove()
+
+        release_type = self._table.type(row)
+        if self._by_type is not None and release_type in self._by_type:
+            self._by_type[release_type].remove()
+
+    def update(self, row: int) -> None:
+        """Note that the ratings in ROW changed, so its weight did too."""
+
+        if self._all is not None:
+            self._all.table = None
+
+        release_type = self._table.type(row)
+        if self._by_type is not None and release_type in self._by_type:
+            self._by_type[release_type].table = None
+
+    def pick(
+        self,
+        mode=UNIFORM,
+        exclude_artists: Collection[str] = (),
+        release_types: Optional[Iterable[str]] = None,
+    ) -> Optional[ReleaseRecord]:
+        """A random to-do entry, or None if every entry is excluded.
+
+        MODE is UNIFORM (every entry equally likely), BY_ARTIST (every artist
+        equally likely, then each of their entries) or BY_POPULARITY (in
+        proportion to ratings). Entries by artists whose links are in
+        EXCLUDE_ARTISTS, or not of one of RELEASE_TYPES, are never picked.
+        """
+
+        if mode not in MODES:
+            raise ValueError(f"Unknown sampling mode '{mode}'")
+
+        if not self._todo:
+            return None
+
+        if release_types is not None:
+            release_types = set(release_types)
+
+        if mode == BY_ARTIST:
+            draw, args = self._draw_by_artist, (exclude_artists, release_types)
+        else:
+            pools = self._pools(release_types)
+            if not pools:
+                return None
+
+            if mode == UNIFORM:
+                draw, args = self._draw_uniform, (pools,)
+            else:
+                draw, args = self._draw_by_popularity, (pools,)
+
+        for _ in range(MAX_ATTEMPTS):
+            link = draw(*args)
+            if link is None:
+                continue
+
+            row = self._todo[link]
+            if self._table.artist_link(row) not in exclude_artists:
+                return self._table.record(row, link)
+
+        return self._pick_exactly(mode, exclude_artists, release_types)
+
+    def _pools(self, release_types: Optional[Collection[str]]) -> List[_Pool]:
+        if release_types is None:
+            if self._all is None or self._all.stale:
+                self._all = _Pool(list(self._todo))
+
+            return [self._all]
+
+        if self._by_type is None:
+            by_type: Dict[str, List[str]] = {}
+            for link, row in self._todo.items():
+                by_type.setdefault(self._table.type(row), []).append(link)
+
+            self._by_type = {
+                release_type: _Pool(links) for release_type, links in by_type.items()
+            }
+
+        pools = []
+        for release_type in release_types:
+            pool = self._by_type.get(release_type)
+            if pool is None:
+                continue
+
+            if pool.stale:
+                pool = _Pool([link for link in pool.links if link in self._todo])
+                self._by_type[release_type] = pool
+
+            if pool.links:
+                pools.append(pool)
+
+        return pools
+
+    def _draw_uniform(self, pools: List[_Pool]) -> Optional[str]:
+        if len(pools) == 1:
+            links = pools[0].links
+        else:
+            links = self.rng.choices(
+                [pool.links for pool in pools], [len(pool.links) for pool in pools]
+            )[0]
+
+        link = links[self.rng.randrange(len(links))]
+        if link not in self._todo:
+            return None
+
+        return link
+
+    def _alias_table(self, pool: _Pool) -> _AliasTable:
+        if pool.table is None:
+            if pool.removed:
+                pool.links = [link for link in pool.links if link in self._todo]
+                pool.removed = 0
+
+            pool.table = _AliasTable(pool.links, [self._weight(link) for link in pool.links])
+
+        return pool.table
+
+    def _draw_by_popularity(self, pools: List[_Pool]) -> Optional[str]:
+        tables = [self._alias_table(pool) for pool in pools]
+        if len(tables) == 1:
+            table = tables[0]
+        else:
+            table = self.rng.choices(tables, [table.total for table in tables])[0]
+
+        link = table.pick(self.rng)
+        if link not in self._todo:
+            return None
+
+        return link
+
+    def _draw_by_artist(
+        self, exclude_artists: Collection[str], release_types: Optional[Collection[str]]
+    ) -> Optional[str]:
+        if self._artist_links is None:
+            self._artist_links = list(self._artists)
+            self._artist_positions = {
+                artist_link: i for i, artist_link in enumerate(self._artist_links)
+            }
+
+        if not self._artist_links:
+            return None
+
+        artist_link = self._artist_links[self.rng.randrange(len(self._artist_links))]
+        if artist_link in exclude_artists:
+            return None
+
+        links = [link for link in self._artists[artist_link] if link in self._todo]
+        if not links:
+            # Every release by the artist is completed, so stop drawing them
+            self._drop_artist(artist_link)
+            return None
+
+        if release_types is not None:
+            links = [
+                link
+                for link in links
+                if self._table.type(self._todo[link]) in release_types
+            ]
+            if not links:
+                return None
+
+        return links[self.rng.randrange(len(links))]
+
+    def _drop_artist(self, artist_link: str) -> None:
+        position = self._artist_positions.pop(artist_link)
+        last = self._artist_links.pop()
+
+        if position < len(self._artist_links):
+            self._artist_links[position] = last
+            self._artist_positions[last] = position
+
+    def _pick_exactly(
+        self,
+        mode: str,
+        exclude_artists: Collection[str],
+        release_types: Optional[Collection[str]],
+    ) -> Optional[ReleaseRecord]:
+        table = self._table
+        links = [
+            link
+            for link, row in self._todo.items()
+            if table.artist_link(row) not in exclude_artists
+            and (release_types is None or table.type(row) in release_types)
+        ]
+        if not links:
+            return None
+
+        if mode == BY_ARTIST:
+            artist_link = self.rng.choice(
+                [*dict.fromkeys(table.artist_link(self._todo[link]) for link in links)]
+            )
+            links = [
+                link for link in links if table.artist_link(self._todo[link]) == artist_link
+            ]
+            link = self.rng.choice(links)
+        elif mode == BY_POPULARITY:
+            link = self.rng.choices(links, [self._weight(link) for link in links])[0]
+        else:
+            link = self.rng.choice(links)
+
+        return table.record(self._todo[link], link)
@@ -0,0 +1,443 @@
+import json
+import os
+import sqlite3
+from pathlib import Path
+from typing import Dict, List
+from checklist import Checklist
+import profiling
+
+
+JOURNAL_MAX_SIZE = 256 * 1024
+
+
+def empty_checklist() -> Dict:
+    return {"viewing": [], "to-do": [], "completed": [], "artist_pages": {}}
+
+
+class JsonStore:
+    """Keeps a checklist as a JSON document plus an append-only journal.
+
+    Each change is appended to NAME.journal and replayed on load, so saving
+    doesn't depend on the size of the checklist. Once the journal grows past
+    JOURNAL_MAX_SIZE it is folded back into NAME.json.
+    """
+
+    suffix = ".json"
+
+    def __init__(self, path: Path, journal_max_size=JOURNAL_MAX_SIZE):
+        self.path = Path(path)
+        self.journal_max_size = journal_max_size
+
+    @property
+    def journal_path(self) -> Path:
+        return self.path.with_suffix(".journal")
+
+    @classmethod
+    def create(cls, path: Path) -> "JsonStore":
+        store = cls(path)
+        store.save(empty_checklist())
+        return store
+
+    @profiling.timed("load")
+    def load(self) -> Dict:
+        with open(self.path) as checklist_file:
+            checklist_json = json.load(checklist_file)
+
+        if self.journal_path.exists():
+            checklist_json, valid_size = _replay_journal(
+                checklist_json, self.journal_path
+            )
+
+            # Drop a torn record so later appends start on a fresh line
+            if valid_size < self.journal_path.stat().st_size:
+                os.truncate(self.journal_path, valid_size)
+
+        return checklist_json
+
+    @profiling.timed("save")
+    def save(self, checklist_json: Dict) -> None:
+        """Rewrite the whole document and start a new journal."""
+
+        document = json.dumps(checklist_json, indent=2)
+        profiling.count("bytes written", len(document))
+
+        temp_path = self.path.with_suffix(".json.tmp")
+        with open(temp_path, "w") as checklist_file:
+            checklist_file.write(document)
+            checklist_file.flush()
+            os.fsync(checklist_file.fileno())
+        os.replace(temp_path, self.path)
+
+        self.journal_path.unlink(missing_ok=True)
+
+    def compact(self, checklist: Checklist) -> None:
+        self.save(checklist.to_json())
+
+    @profiling.timed("journal")
+    def _append(self, checklist: Checklist, record: Dict) -> None:
+        line = json.dumps(record) + "\n"
+        profiling.count("bytes written", len(line))
+
+        with open(self.journal_path, "a") as journal_file:
+            journal_file.write(line)
+            journal_file.flush()
+            os.fsync(journal_file.fileno())
+
+        if self.journal_path.stat().st_size > self.journal_max_size:
+            self.compact(checklist)
+
+    def add(self, checklist: Checklist, entries: List[Dict]) -> None:
+        self._append(checklist, {"op": "add", "entries": entries})
+
+    def check(self, checklist: Checklist, entries: List[Dict]) -> None:
+        links = [entry["link"] for entry in entries]
+        self._append(checklist, {"op": "check", "links": links})
+
+    def view(self, checklist: Checklist, entries: List[Dict]) -> None:
+        links = [entry["link"] for entry in entries]
+        self._append(checklist, {"op": "view", "links": links})
+
+    def refresh(
+        self, checklist: Checklist, entries: List[Dict], artist_pages: Dict[str, Dict]
+    ) -> None:
+        ratings = [[entry["link"], entry["ratings"], entry["average"]] for entry in entries]
+        self._append(
+            checklist,
+            {"op": "refresh", "ratings": ratings, "artist_pages": artist_pages},
+        )
+
+    def close(self) -> None:
+        pass
+
+    def delete(self) -> None:
+        self.path.unlink(missing_ok=True)
+        self.journal_path.unlink(missing_ok=True)
+
+    def rename(self, new_path: Path) -> None:
+        journal_path = self.journal_path
+        self.path = self.path.rename(new_path)
+
+        if journal_path.exists():
+            journal_path.rename(self.journal_path)
+
+
+def _replay_journal(checklist_json: Dict, journal_path: Path) -> (Dict, int):
+    """Apply every journal record to a checklist loaded from its base file.
+
+    Records are idempotent, so a journal that was already folded into the
+    base file (e.g. after a crash mid-compaction) can safely be replayed.
+    Also returns the size of the journal up to its last complete record.
+    """
+
+    todo = {entry["link"]: entry for entry in checklist_json["to-do"]}
+    completed = {entry["link"]: entry for entry in checklist_json["completed"]}
+    viewing = checklist_json["viewing"]
+    artist_pages = dict(checklist_json.get("artist_pages", {}))
+
+    valid_size = 0
+    with open(journal_path, "rb") as journal_file:
+        for line in journal_file:
+            # A torn write from a crash can only be the last line
+            if not line.endswith(b"\n"):
+                break
+            try:
+                record = json.loads(line)
+            except ValueError:
+                break
+
+            valid_size += len(line)
+
+            match (record["op"]):
+                case ("add"):
+                    for entry in record["entries"]:
+                        if entry["link"] not in todo and entry["link"] not in completed:
+                            todo[entry["link"]] = entry
+                case ("check"):
+                    for link in record["links"]:
+                        if link in todo:
+                            completed[link] = todo.pop(link)
+                case ("view"):
+                    viewing = [
+                        todo.get(link) or completed[link]
+                        for link in record["links"]
+                        if link in todo or link in completed
+                    ]
+                case ("refresh"):
+                    for link, ratings, average in record["ratings"]:
+                        entry = todo.get(link) or completed.get(link)
+                        if entry:
+                            entry["ratings"] = ratings
+                            entry["average"] = average
+                    artist_pages.update(record["artist_pages"])
+
+    checklist_json = {
+        "viewing": viewing,
+        "to-do": list(todo.values()),
+        "completed": list(completed.values()),
+        "artist_pages": artist_pages,
+    }
+
+    return checklist_json, valid_size
+
+
+class SqliteStore:
+    """Keeps a checklist in an SQLite database, updated row by row."""
+
+    suffix = ".db"
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS releases (
+            link TEXT PRIMARY KEY,
+            artist TEXT NOT NULL,
+            title TEXT NOT NULL,
+            artist_link TEXT NOT NULL,
+            year,
+            type TEXT NOT NULL,
+            ratings INTEGER,
+            average REAL
+        );
+        CREATE TABLE IF NOT EXISTS checklist (
+            link TEXT PRIMARY KEY REFERENCES releases (link),
+            status TEXT NOT NULL,
+            position INTEGER NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS viewing (
+            position INTEGER PRIMARY KEY,
+            link TEXT NOT NULL REFERENCES releases (link)
+        );
+        CREATE TABLE IF NOT EXISTS artist_pages (
+            artist_link TEXT PRIMARY KEY,
+            hash TEXT,
+            refreshed REAL
+        );
+        CREATE INDEX IF NOT EXISTS releases_artist_link ON releases (artist_link);
+        CREATE INDEX IF NOT EXISTS checklist_position ON checklist (position);
+    """
+
+    COLUMNS = [
+        "artist",
+        "title",
+        "link",
+        "artist_link",
+        "year",
+        "type",
+        "ratings",
+        "average",
+    ]
+
+    # Columns added since the first version of the schema
+    ADDED_COLUMNS = {"ratings": "INTEGER", "average": "REAL"}
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self._connection = None
+
+    @property
+    def connection(self) -> sqlite3.Connection:
+        if self._connection is None:
+            self._connection = sqlite3.connect(self.path)
+            self._connection.execute("PRAGMA journal_mode = WAL")
+            self._connection.execute("PRAGMA synchronous = NORMAL")
+            self._connection.executescript(self.SCHEMA)
+            self._add_missing_columns()
+
+        return self._connection
+
+    def _add_missing_columns(self) -> None:
+        existing = {
+            row[1] for row in self._connection.execute("PRAGMA table_info(releases)")
+        }
+
+        for column, column_type in self.ADDED_COLUMNS.items():
+            if column not in existing:
+                self._connection.execute(
+                    f"ALTER TABLE releases ADD COLUMN {column} {column_type}"
+                )
+
+    @classmethod
+    def create(cls, path: Path) -> "SqliteStore":
+        store = cls(path)
+        store.connection.commit()
+        return store
+
+    def _next_position(self) -> int:
+        row = self.connection.execute("SELECT MAX(position) FROM checklist").fetchone()
+        return (row[0] or 0) + 1
+
+    def _select(self, query: str, *args) -> List[Dict]:
+        columns = ", ".join(f"releases.{column}" for column in self.COLUMNS)
+        rows = self.connection.execute(
+            query.format(columns=columns), args
+        ).fetchall()
+
+        return [dict(zip(self.COLUMNS, row)) for row in rows]
+
+    @profiling.timed("load")
+    def load(self) -> Dict:
+        checklist_query = """
+            SELECT {columns} FROM checklist
+            JOIN releases ON releases.link = checklist.link
+            WHERE checklist.status = ?
+            ORDER BY checklist.position
+        """
+        viewing_query = """
+            SELECT {columns} FROM viewing
+            JOIN releases ON releases.link = viewing.link
+            ORDER BY viewing.position
+        """
+
+        artist_pages = {
+            artist_link: {"hash": content_hash, "refreshed": refreshed}
+            for artist_link, content_hash, refreshed in self.connection.execute(
+                "SELECT artist_link, hash, refreshed FROM artist_pages"
+            )
+        }
+
+        return {
+            "viewing": self._select(viewing_query),
+            "to-do": self._select(checklist_query, "to-do"),
+            "completed": self._select(checklist_query, "completed"),
+            "artist_pages": artist_pages,
+        }
+
+    def _insert(self, entries: List[Dict], status: str) -> None:
+        position = self._next_position()
+
+        self.connection.executemany(
+            "INSERT OR REPLACE INTO releases "
+            "(link, artist, title, artist_link, year, type, ratings, average) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            [
+                (
+                    entry["link"],
+                    entry["artist"],
+                    entry["title"],
+                    entry["artist_link"],
+                    entry["year"],
+                    entry["type"],
+                    entry.get("ratings"),
+                    entry.get("average"),
+                )
+                for entry in entries
+            ],
+        )
+        self.connection.executemany(
+            "INSERT OR REPLACE INTO checklist VALUES (?, ?, ?)",
+            [
+                (entry["link"], status, position + i)
+                for i, entry in enumerate(entries)
+            ],
+        )
+
+    def _upsert_artist_pages(self, artist_pages: Dict[str, Dict]) -> None:
+        self.connection.executemany(
+            "INSERT OR REPLACE INTO artist_pages VALUES (?, ?, ?)",
+            [
+                (artist_link, page["hash"], page["refreshed"])
+                for artist_link, page in artist_pages.items()
+            ],
+        )
+
+    def _replace_viewing(self, entries: List[Dict]) -> None:
+        self.connection.execute("DELETE FROM viewing")
+        self.connection.executemany(
+            "INSERT INTO viewing VALUES (?, ?)",
+            [(i, entry["link"]) for i, entry in enumerate(entries)],
+        )
+
+    @profiling.timed("save")
+    def save(self, checklist_json: Dict) -> None:
+        """Replace the whole checklist, e.g. when migrating from JSON."""
+
+        with self.connection:
+            self.connection.execute("DELETE FROM viewing")
+            self.connection.execute("DELETE FROM checklist")
+            self.connection.execute("DELETE FROM releases")
+            self.connection.execute("DELETE FROM artist_pages")
+            self._insert(checklist_json["to-do"], "to-do")
+            self._insert(checklist_json["completed"], "completed")
+            self._replace_viewing(checklist_json["viewing"])
+            self._upsert_artist_pages(checklist_json.get("artist_pages", {}))
+
+    @profiling.timed("save")
+    def add(self, checklist: Checklist, entries: List[Dict]) -> None:
+        with self.connection:
+            self._insert(entries, "to-do")
+
+    @profiling.timed("save")
+    def check(self, checklist: Checklist, entries: List[Dict]) -> None:
+        position = self._next_position()
+
+        with self.connection:
+            self.connection.executemany(
+                "UPDATE checklist SET status = 'completed', position = ? WHERE link = ?",
+                [(position + i, entry["link"]) for i, entry in enumerate(entries)],
+            )
+
+    @profiling.timed("save")
+    def view(self, checklist: Checklist, entries: List[Dict]) -> None:
+        with self.connection:
+            self._replace_viewing(entries)
+
+    @profiling.timed("save")
+    def refresh(
+        self, checklist: Checklist, entries: List[Dict], artist_pages: Dict[str, Dict]
+    ) -> None:
+        with self.connection:
+            self.connection.executemany(
+                "UPDATE releases SET ratings = ?, average = ? WHERE link = ?",
+                [
+                    (entry["ratings"], entry["average"], entry["link"])
+                    for entry in entries
+                ],
+            )
+            self._upsert_artist_pages(artist_pages)
+
+    def compact(self, checklist: Checklist) -> None:
+        self.connection.execute("VACUUM")
+
+    def close(self) -> None:
+        if self._connection is not None:
+            self._connection.close()
+            self._connection = None
+
+    def delete(self) -> None:
+        self.close()
+        for suffix in ["", "-wal", "-shm"]:
+            Path(f"{self.path}{suffix}").unlink(missing_ok=True)
+
+    def rename(self, new_path: Path) -> None:
+        self.close()
+        self.path = self.path.rename(new_path)
+
+
+STORES = [JsonStore, SqliteStore]
+
+
+def find_store(directory: Path, name: str):
+    """Open the checklist called NAME in DIRECTORY with whichever backend it uses."""
+
+    for store_class in STORES:
+        path = Path(directory).joinpath(f"{name}{store_class.suffix}")
+        if path.exists():
+            return store_class(path)
+
+    return None
+
+
+def migrate_to_sqlite(store: JsonStore) -> SqliteStore:
+    """Copy a JSON checklist into a new SQLite database next to it.
+
+    The JSON file is kept, renamed with a .bak suffix.
+    """
+
+    checklist_json = store.load()
+    store.save(checklist_json)
+
+    sqlite_store = SqliteStore.create(store.path.with_suffix(SqliteStore.suffix))
+    sqlite_store.save(checklist_json)
+    sqlite_store.close()
+
+    store.rename(store.path.with_suffix(".json.bak"))
+
+    return sqlite_store
@@ -8,6 +8,9 @@ setup(
     install_requires=[
         "click",
     ],
+    extras_require={
+        "aio": ["aiohttp"],
+    },
     entry_points={
         "console_scripts": [
             "mchecklist = mchecklist.cli:cli",